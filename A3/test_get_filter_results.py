@@ -1,5 +1,6 @@
 import unittest
 import twitterverse_functions as tf
+import twitterverse_graph as tg
 
 
 class TestGetFilterResults(unittest.TestCase):
@@ -334,6 +335,94 @@ class TestGetFilterResults(unittest.TestCase):
                
         self.assertEqual(expected, actual)  
 
+
+    def test_following_operation_with_index(self):
+        """Test get_filter_results with twitterverse, list of str users, 
+        filter dictionary where only operation is following, and a follower 
+        index built from the twitterverse."""
+        
+        twitterverse = { 'aa':{'name':'Andy', 'location':'China', 'web':'', 
+                              'bio':'', 'following':[]},
+                         'bb':{'name':'Bert', 'location':'Germany', 'web':'', 
+                              'bio':'', 'following':['aa']},
+                         'cc':{'name':'Charles', 'location':'England', 
+                               'web':'', 'bio':'', 'following':['aa', 'bb']},
+                         'dd':{'name':'Drake', 'location':'Denmark', 'web':'',
+                              'bio':'', 'following':['aa', 'bb', 'cc']}}
+        
+        users = ['dd', 'cc', 'bb', 'aa']
+        
+        filter_dict = {'following': 'bb'}
+        
+        follower_index = tf.build_follower_index(twitterverse)
+        
+        actual = tf.get_filter_results(twitterverse, users, filter_dict, 
+                                       follower_index)
+        
+        expected = ['dd', 'cc']
+        
+        self.assertEqual(expected, actual)
+        
+        
+    def test_follower_without_record(self):
+        """Test get_filter_results with a follower filter naming a user 
+        with no record, before and after a filter that leaves no users."""
+        
+        twitterverse = { 'a':{'name':'Andy', 'location':'China', 'web':'', 
+                              'bio':'', 'following':[]},
+                         'b':{'name':'Bert', 'location':'Germany', 'web':'', 
+                              'bio':'', 'following':['a']}}
+        
+        users = ['a', 'b']
+        
+        self.assertRaises(KeyError, tf.get_filter_results, twitterverse, 
+                          users, {'name-includes': 'zzzz', 
+                                  'follower': 'nobody'})
+        self.assertRaises(KeyError, tf.get_filter_results, twitterverse, 
+                          users, {'follower': 'nobody', 
+                                  'name-includes': 'zzzz'})
+        self.assertEqual([], tf.get_filter_results(twitterverse, [], 
+                                                   {'follower': 'nobody'}))
+    
+    
+    def test_same_errors_as_graph(self):
+        """Test that filtering users with and without records raises 
+        KeyError on a graph exactly when it does on the dictionary, in 
+        either order of the filters."""
+        
+        twitterverse = { 'a':{'name':'Andy', 'location':'China', 'web':'', 
+                              'bio':'', 'following':['b', 'zed']},
+                         'b':{'name':'Bert', 'location':'Germany', 'web':'', 
+                              'bio':'', 'following':['a']}}
+        graph = tg.graph_from_twv(twitterverse)
+        text_index = tf.build_text_index(twitterverse)
+        
+        filters = [('name-includes', 'zzzz'), ('location-includes', 'an'), 
+                   ('follower', 'a'), ('follower', 'zed'), 
+                   ('following', 'a'), ('following', 'zed')]
+        for users in [[], ['a', 'b'], ['b', 'zed'], ['zed']]:
+            for first in filters:
+                for second in filters:
+                    filter_dict = dict([first, second])
+                    results = []
+                    for get_filter_results in [
+                            lambda: tf.get_filter_results(
+                                twitterverse, list(users), filter_dict),
+                            lambda: tf.get_filter_results(
+                                twitterverse, list(users), filter_dict, 
+                                None, text_index),
+                            lambda: tg.get_filter_results(
+                                graph, list(users), filter_dict),
+                            lambda: tg.get_filter_results(
+                                graph, list(users), 
+                                dict(reversed(filter_dict.items())))]:
+                        try:
+                            results.append(get_filter_results())
+                        except KeyError:
+                            results.append(KeyError)
+                    self.assertEqual([results[0]] * 4, results, 
+                                     (users, filter_dict))
+
                 
 if __name__ == '__main__':
     unittest.main(exit=False)
@@ -0,0 +1,82 @@
+import unittest
+import twitterverse_functions as tf
+import twitterverse_graph as tg
+
+
+class TestGetSearchResults(unittest.TestCase):
+    """unittest test methods for get_search_results."""
+
+
+    def setUp(self):
+        """Create a twitterverse where a, b, c and e form a chain of
+        following and a and d follow each other."""
+        
+        self.twitterverse = {'a':{'name':'Andy', 'location':'China', 'web':'', 
+                                  'bio':'', 'following':['b', 'd']},
+                             'b':{'name':'Bert', 'location':'Germany', 
+                                  'web':'', 'bio':'', 'following':['c']},
+                             'c':{'name':'Charles', 'location':'England', 
+                                  'web':'', 'bio':'', 'following':['e']},
+                             'd':{'name':'Drake', 'location':'Denmark', 
+                                  'web':'', 'bio':'', 'following':['a']}}
+        self.follower_index = tf.build_follower_index(self.twitterverse)
+    
+    
+    def search(self, operations):
+        """Return the results of operations from a, checking that they are
+        the same with and without the follower index."""
+        
+        search_dict = {'username': 'a', 'operations': operations}
+        actual = tf.get_search_results(self.twitterverse, search_dict)
+        self.assertEqual(actual, tf.get_search_results(
+            self.twitterverse, search_dict, self.follower_index))
+        return actual
+    
+    
+    def test_hops(self):
+        """Test the following*N and followers*N operations."""
+        
+        self.assertEqual(['a', 'b', 'c', 'd'], self.search(['following*2']))
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], 
+                         self.search(['following*9']))
+        self.assertEqual(['a', 'd'], self.search(['followers*3']))
+    
+    
+    def test_mutual(self):
+        """Test the mutual operation."""
+        
+        self.assertEqual(['d'], self.search(['mutual']))
+        self.assertEqual(['a'], self.search(['mutual', 'mutual']))
+    
+    
+    def test_path_to(self):
+        """Test the path-to operation, and that invalid operations are still
+        ignored."""
+        
+        self.assertEqual(['a', 'b', 'c', 'e'], self.search(['path-to e']))
+        self.assertEqual(['d'], self.search(['following', 'path-to d', 'x*2']))
+        self.assertEqual([], self.search(['path-to zed']))
+        self.assertEqual(['a', 'b', 'c', 'e'], 
+                         tf.shortest_path(self.twitterverse, ['a'], 'e'))
+        self.assertEqual(['a'], self.search(['following*0', 'path-to']))
+
+
+
+    def test_path_to_unknown_user(self):
+        """Test a path-to from a user that has no record, on the dictionary
+        and on a graph."""
+
+        graph = tg.graph_from_twv(self.twitterverse)
+        for operations in (['path-to zed'], ['path-to zed', 'path-to zed'],
+                           ['path-to zed', 'following'], ['path-to a'],
+                           ['following', 'path-to zed']):
+            search_dict = {'username': 'zed', 'operations': operations}
+            self.assertEqual(tf.get_search_results(self.twitterverse,
+                                                   search_dict),
+                             tg.get_search_results(graph, search_dict))
+        self.assertEqual(['zed'], tg.get_search_results(
+            graph, {'username': 'zed', 'operations': ['path-to zed']}))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,60 @@
+import unittest
+import twitterverse_analytics as ta
+import twitterverse_functions as tf
+import twitterverse_graph as tg
+
+
+class TestAnalytics(unittest.TestCase):
+    """unittest test methods for twitterverse_analytics."""
+
+
+    def setUp(self):
+        """Create a twitterverse and its graph."""
+
+        self.twitterverse = {'a':{'name':'Andy', 'location':'China', 'web':'',
+                                  'bio':'', 'following':['b', 'zed']},
+                             'b':{'name':'Bert', 'location':'Germany',
+                                  'web':'', 'bio':'', 'following':['a', 'a']},
+                             'c':{'name':'Charles', 'location':'England',
+                                  'web':'', 'bio':'', 'following':['a', 'b']}}
+        self.graph = tg.graph_from_twv(self.twitterverse)
+
+
+    def test_degrees_match_follower_index(self):
+        """Test that in-degrees are the sizes of the follower index's sets
+        and out-degrees count distinct users followed."""
+
+        follower_index = tf.build_follower_index(self.twitterverse)
+        in_degrees = ta.in_degrees(self.graph)
+        out_degrees = ta.out_degrees(self.graph)
+
+        for user_id in range(len(self.graph)):
+            username = self.graph.usernames[user_id]
+            self.assertEqual(len(follower_index.get(username, [])),
+                             in_degrees[user_id])
+        self.assertEqual([2, 1, 0, 2], list(out_degrees))
+
+
+    def test_mutual_and_reach(self):
+        """Test mutual follow counts and k-hop reach."""
+
+        self.assertEqual([1, 1, 0, 0], list(ta.mutual_counts(self.graph)))
+        self.assertEqual(1, ta.summary(self.graph)['mutual_pairs'])
+        self.assertEqual({0: 2, 3: 3}, ta.reach_sizes(self.graph, 2,
+                                                      user_ids=[0, 3]))
+
+
+
+    def test_self_follow(self):
+        """Test that a user following itself is not its own mutual."""
+
+        self.twitterverse['c']['following'].append('c')
+        self.twitterverse['a']['following'].append('a')
+        graph = tg.graph_from_twv(self.twitterverse)
+
+        self.assertEqual([1, 1, 0, 0], list(ta.mutual_counts(graph)))
+        self.assertEqual(1, ta.summary(graph)['mutual_pairs'])
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
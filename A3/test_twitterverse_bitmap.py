@@ -0,0 +1,69 @@
+import unittest
+import twitterverse_bitmap as tb
+import twitterverse_graph as tg
+
+
+class TestBitmap(unittest.TestCase):
+    """unittest test methods for twitterverse_bitmap."""
+
+
+    def test_set_algebra(self):
+        """Test that bitmap operators match set operations."""
+
+        first = set(range(0, 200, 3))
+        second = set(range(0, 200, 5))
+        first_bitmap = tb.from_ids(first)
+        second_bitmap = tb.from_ids(second)
+        user_ids = range(-1, 210)
+
+        for bitmap, expected in [(first_bitmap | second_bitmap,
+                                  first | second),
+                                 (first_bitmap & second_bitmap,
+                                  first & second),
+                                 (first_bitmap & ~second_bitmap,
+                                  first - second)]:
+            is_member = tb.member_test(bitmap)
+            self.assertEqual(sorted(expected),
+                             [user_id for user_id in user_ids
+                              if user_id >= 0 and is_member(user_id)])
+        self.assertFalse(tb.member_test(tb.from_ids([]))(0))
+
+
+    def test_graph_filters(self):
+        """Test combined follower and following filters on a graph."""
+
+        graph = tg.build_graph([('a', 'A', '', '', '', ['b', 'c', 'z']),
+                                ('b', 'B', '', '', '', ['c']),
+                                ('c', 'C', '', '', '', ['b'])])
+
+        self.assertEqual(['c', 'c'], tg.get_filter_results(
+            graph, ['z', 'c', 'b', 'c'], {'follower': 'a', 'following': 'b'}))
+        self.assertEqual(['b'], tg.get_filter_results(
+            graph, ['z', 'c', 'b'], {'follower': 'a', 'following': 'c'}))
+        self.assertRaises(KeyError, tg.get_filter_results, graph,
+                          ['z', 'c', 'b'], {'following': 'x', 'follower': 'x'})
+
+
+    def test_sparse_graph_filters(self):
+        """Test follower and following filters on a graph with many IDs."""
+
+        graph = tg.build_graph([('a', 'A', '', '', '', ['b'] +
+                                 ['g' + str(i) for i in range(500)]),
+                                ('b', 'B', '', '', '', ['a', 'g499']),
+                                ('c', 'C', '', '', '', ['b'])])
+        users = ['g499', 'b', 'c', 'a', 'z']
+
+        self.assertEqual(['g499', 'b'], tg.get_filter_results(
+            graph, users, {'follower': 'a'}))
+        self.assertEqual(['a'], tg.get_filter_results(
+            graph, users, {'follower': 'b', 'following': 'b'}))
+        self.assertEqual(['b'], tg.get_filter_results(
+            graph, users, {'following': 'a'}))
+        self.assertEqual(['b'], tg.get_filter_results(
+            graph, users, {'follower': 'a', 'following': 'a'}))
+        self.assertEqual([], tg.get_filter_results(
+            graph, users, {'following': 'z', 'follower': 'c'}))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,88 @@
+import unittest
+import twitterverse_cache as tc
+import twitterverse_functions as tf
+import twitterverse_updates as tu
+
+
+class TestQueryCache(unittest.TestCase):
+    """unittest test methods for QueryCache."""
+
+
+    def setUp(self):
+        """Create a twitterverse, its follower index and a cache on them."""
+
+        self.twitterverse = {'a':{'name':'Andy', 'location':'China', 'web':'',
+                                  'bio':'', 'following':[]},
+                             'b':{'name':'Bert', 'location':'Germany',
+                                  'web':'', 'bio':'', 'following':['a']},
+                             'c':{'name':'Charles', 'location':'England',
+                                  'web':'', 'bio':'', 'following':['a', 'b']}}
+        self.follower_index = tf.build_follower_index(self.twitterverse)
+        self.cache = tc.QueryCache(self.twitterverse, self.follower_index)
+
+
+    def test_repeated_query_hits(self):
+        """Test that a repeated search and filter is answered from the cache,
+        but not one with its filters given in a different order."""
+
+        search_dict = {'username': 'a', 'operations': ['followers']}
+
+        first = self.cache.get_filter_results(search_dict,
+                                              {'name-includes': 'e',
+                                               'location-includes': 'e'})
+        second = self.cache.get_filter_results(search_dict,
+                                               {'name-includes': 'e',
+                                                'location-includes': 'e'})
+        self.assertEqual(1, self.cache.hits)
+
+        third = self.cache.get_filter_results(search_dict,
+                                              {'location-includes': 'e',
+                                               'name-includes': 'e'})
+
+        self.assertEqual(['b', 'c'], first)
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        self.assertEqual(3, self.cache.misses)
+
+
+    def test_results_are_copies(self):
+        """Test that changing a returned result does not change the cache."""
+
+        search_dict = {'username': 'c', 'operations': ['following']}
+
+        self.cache.get_search_results(search_dict).reverse()
+
+        self.assertEqual(['a', 'b'],
+                         self.cache.get_search_results(search_dict))
+
+
+    def test_update_invalidates(self):
+        """Test that results are recomputed after the twitterverse is
+        updated through twitterverse_updates."""
+
+        search_dict = {'username': 'a', 'operations': ['followers']}
+        self.cache.get_search_results(search_dict)
+
+        tu.unfollow(self.twitterverse, 'c', 'a', self.follower_index)
+
+        self.assertEqual(['b'], self.cache.get_search_results(search_dict))
+        self.assertEqual(0, self.cache.hits)
+
+
+    def test_eviction(self):
+        """Test that the least recently used result is evicted when the
+        cache is full."""
+
+        cache = tc.QueryCache(self.twitterverse, self.follower_index,
+                              max_entries=2)
+
+        for username in ['a', 'b', 'c']:
+            cache.get_search_results({'username': username,
+                                      'operations': ['followers']})
+
+        self.assertEqual(2, len(cache.results))
+        self.assertNotIn(('search', ('a', ('followers',))), cache.results)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,165 @@
+import copy
+import io
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import unittest
+import twitterverse_functions as tf
+import twitterverse_lazy as tz
+import twitterverse_updates as tu
+
+
+DATA = '''a
+Andy
+China
+http://a.ca
+Hi
+there
+ENDBIO
+b
+END
+b
+Bert
+Germany
+
+ENDBIO
+a
+END
+'''
+
+
+class TestLazyUser(unittest.TestCase):
+    """unittest test methods for the LazyUsers of a lazily loaded
+    twitterverse."""
+
+
+    def setUp(self):
+        """Write DATA to a data file and load it as a plain twitterverse."""
+
+        data_file = tempfile.NamedTemporaryFile('w', delete=False)
+        data_file.write(DATA)
+        data_file.close()
+        self.data_filename = data_file.name
+        self.data_files = []
+        self.expected = tf.process_data(io.StringIO(DATA))
+
+
+    def tearDown(self):
+        """Close and remove the data file."""
+
+        for data_file in self.data_files:
+            data_file.close()
+        os.remove(self.data_filename)
+
+
+    def load(self):
+        """Return the data file loaded lazily, keeping it open for the
+        users' webs and bios, and check that no user has read them yet."""
+
+        data_file = open(self.data_filename)
+        self.data_files.append(data_file)
+        twitterverse = tz.process_data(data_file)
+        for user in twitterverse:
+            self.assertFalse(dict.__contains__(twitterverse[user], 'bio'))
+        return twitterverse
+
+
+    def test_equality(self):
+        """Test that an unloaded user equals the plain user dictionary, from
+        either side, and another unloaded user of the same record."""
+
+        self.assertTrue(self.expected['a'] == self.load()['a'])
+        self.assertTrue(self.load()['a'] == self.expected['a'])
+        self.assertFalse(self.expected['a'] != self.load()['a'])
+        self.assertTrue(self.load() == self.load())
+        self.assertFalse(self.load()['a'] != self.load()['a'])
+        self.assertNotEqual(self.load()['a'], self.load()['b'])
+        self.assertEqual(self.expected, self.load())
+
+
+    def test_fields(self):
+        """Test that going over the fields of an unloaded user sees its web
+        and bio."""
+
+        for fields in [list, lambda user: list(user.keys()),
+                       lambda user: list(user.items()),
+                       lambda user: list(user.values()), len, dict, repr,
+                       lambda user: {**user}]:
+            self.assertEqual(fields(self.expected['a']),
+                             fields(self.load()['a']))
+
+        self.assertIn('bio', self.load()['b'])
+        self.assertEqual('', self.load()['b'].get('web'))
+        self.assertEqual('Hi\nthere', self.load()['a']['bio'])
+
+
+    def test_copy_and_pickle(self):
+        """Test that an unloaded user copies and pickles as a plain
+        dictionary with every field."""
+
+        for duplicate in [copy.copy, copy.deepcopy,
+                          lambda user: pickle.loads(pickle.dumps(user)),
+                          lambda user: user.copy()]:
+            user = duplicate(self.load()['a'])
+            self.assertIs(dict, type(user))
+            self.assertEqual(self.expected['a'], user)
+
+        self.assertEqual(self.expected,
+                         pickle.loads(pickle.dumps(self.load())))
+
+
+    def test_set_profile(self):
+        """Test setting the web or bio of an unloaded user, which keeps the
+        other field from the file and the order of the fields."""
+
+        twitterverse = self.load()
+        tu.set_profile(twitterverse, 'a', 'bio', 'Bye')
+        tu.set_profile(twitterverse, 'b', 'web', 'http://b.ca')
+
+        self.expected['a']['bio'] = 'Bye'
+        self.expected['b']['web'] = 'http://b.ca'
+        self.assertEqual(self.expected, twitterverse)
+
+        user = self.load()['a']
+        user['bio'] = 'Bye'
+        self.assertEqual(list(self.expected['a'].items()), list(user.items()))
+
+
+
+    def test_threads(self):
+        """Test that threads reading the same unloaded users at once all see
+        every field."""
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        seen = []
+
+        def read(twitterverse):
+            for user in ['a', 'b'] * 20:
+                seen.append((user, 'following' in twitterverse[user],
+                             twitterverse[user]['following'],
+                             twitterverse[user]['bio']))
+
+        try:
+            for i in range(50):
+                twitterverse = self.load()
+                threads = [threading.Thread(target=read, args=(twitterverse,))
+                           for j in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(50 * 4 * 40, len(seen))
+        for user, has_following, following, bio in seen:
+            self.assertEqual((True, self.expected[user]['following'],
+                              self.expected[user]['bio']),
+                             (has_following, following, bio))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
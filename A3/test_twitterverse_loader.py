@@ -0,0 +1,119 @@
+import io
+import os
+import tempfile
+import unittest
+import twitterverse_graph as tg
+import twitterverse_loader as tl
+
+
+def write_data(text):
+    """(str) -> str
+
+    Write text to a new temporary data file and return its name.
+    """
+
+    data_file = tempfile.NamedTemporaryFile('w', newline='', delete=False)
+    data_file.write(text)
+    data_file.close()
+    return data_file.name
+
+
+class TestLoadGraph(unittest.TestCase):
+    """unittest test methods for twitterverse_loader.load_graph."""
+
+
+    def assertSameGraph(self, text, jobs=1, shard_count=None):
+        """Assert that load_graph gives the graph process_graph does."""
+
+        data_filename = write_data(text)
+        expected = tg.process_graph(io.StringIO(text.replace('\r\n', '\n')))
+        actual = tl.load_graph(data_filename, jobs=jobs,
+                               shard_count=shard_count)
+        os.remove(data_filename)
+
+        self.assertEqual(expected.usernames, actual.usernames)
+        self.assertEqual(expected.has_record, actual.has_record)
+        for column in tl.FIELD_LINES:
+            self.assertEqual(getattr(expected, column),
+                             [getattr(actual, column)[user_id]
+                              for user_id in range(len(actual))])
+        self.assertEqual(expected.following_targets,
+                         actual.following_targets)
+        self.assertEqual(expected.follower_sources, actual.follower_sources)
+
+
+    def test_usual_records(self):
+        """Test records in the usual layout, read from the mapped file."""
+
+        self.assertSameGraph('a\nAl \n TO\n web \nHi\n there \nENDBIO\nb\n'
+                             'c\nEND\nb\nBo\nNY\n\nENDBIO\nEND\n')
+
+
+    def test_irregular_records(self):
+        """Test records parsed by the fallback after a bio line of END."""
+
+        self.assertSameGraph('a\nAl\nTO\n\nENDBIO\nb\nEND\nb\nBo\nNY\n\n'
+                             'END\nENDBIO\na\nEND\nc\nCy\n\n\nENDBIO\nEND\n')
+
+
+    def test_crlf_records(self):
+        """Test a data file with '\\r\\n' line endings."""
+
+        self.assertSameGraph('a\r\nAl\r\nTO\r\nw\r\nHi\r\nENDBIO\r\nb\r\n'
+                             'END\r\n')
+
+
+    def test_name_end(self):
+        """Test a user whose name line is END, which ends no record."""
+
+        self.assertSameGraph('c\nEND\nc\nc\nc\nENDBIO\nEND\n'
+                             'd\nD\n\n\nENDBIO\nc\nEND\n')
+        for shard_count in range(1, 4):
+            self.assertSameGraph('c\nEND\nc\nc\nc\nENDBIO\nEND\n' * 3, 1,
+                                 shard_count)
+
+
+    def test_empty_file(self):
+        """Test an empty data file."""
+
+        self.assertSameGraph('')
+
+
+    def test_shards(self):
+        """Test a data file parsed in shards by worker processes."""
+
+        text = 'a\nAl\nTO\n\nENDBIO\nb\nEND\nb\nBo\n\n\nENDBIO\na\nc\nEND\n'
+        for shard_count in range(1, 6):
+            self.assertSameGraph(text * 5, 2, shard_count)
+
+
+    def test_shard_after_end_line(self):
+        """Test shards split after an 'END' line that ends no record."""
+
+        text = 'a\nA\n\n\nENDBIO\nEND\nEND\nE\n\n\nENDBIO\na\nEND\n'
+        for shard_count in range(1, 8):
+            self.assertSameGraph(text * 3, 1, shard_count)
+
+
+    def test_shard_irregular_records(self):
+        """Test shards with a record that has a bio line of END."""
+
+        text = ('a\nA\n\n\nENDBIO\nb\nEND\nb\nB\n\nbio\nEND\nENDBIO\n'
+                'a\nEND\nc\nC\n\n\nENDBIO\nb\nEND\n')
+        for shard_count in range(1, 8):
+            self.assertSameGraph(text * 2, 1, shard_count)
+
+
+    def test_column_bounds(self):
+        """Test that a column rejects user IDs it does not hold."""
+
+        data_filename = write_data('a\nAl\nTO\n\nENDBIO\nEND\n')
+        graph = tl.load_graph(data_filename)
+        os.remove(data_filename)
+
+        self.assertEqual('Al', graph.names[0])
+        self.assertRaises(IndexError, graph.names.__getitem__, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
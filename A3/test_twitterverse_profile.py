@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import twitterverse_functions as tf
+import twitterverse_graph as tg
+import twitterverse_profile as tp
+import twitterverse_program as program
+
+
+class TestQueryProfile(unittest.TestCase):
+    """unittest test methods for QueryProfile."""
+
+
+    def setUp(self):
+        """Create a twitterverse with no follower index."""
+
+        self.twitterverse = {'a':{'name':'Andy', 'location':'China', 'web':'',
+                                  'bio':'', 'following':[]},
+                             'b':{'name':'Bert', 'location':'Germany',
+                                  'web':'', 'bio':'', 'following':['a']},
+                             'c':{'name':'Charles', 'location':'England',
+                                  'web':'', 'bio':'', 'following':['a', 'b']}}
+
+
+    def test_counts_stages(self):
+        """Test that each stage of a query is counted and that results are
+        the same as without profiling."""
+
+        users = ['c', 'a', 'b']
+
+        with tp.QueryProfile() as profile:
+            found = tf.get_search_results(self.twitterverse,
+                                          {'username': 'a',
+                                           'operations': ['followers']})
+            filtered = tf.get_filter_results(self.twitterverse, users,
+                                             {'name-includes': 'e'})
+            result = tf.get_present_string(self.twitterverse, users,
+                                           {'sort-by': 'popularity',
+                                            'format': 'short'})
+        report = profile.report()
+
+        self.assertEqual(['b', 'c'], found)
+        self.assertEqual(['c', 'b'], filtered)
+        self.assertEqual("['a', 'b', 'c']", result)
+        self.assertEqual(2, report['stages']['search']['users'])
+        self.assertEqual(3, report['stages']['filter']['users'])
+        self.assertEqual(1, report['stages']['sort']['calls'])
+        self.assertEqual(3, report['sort_keys'])
+        self.assertEqual(2, report['follower_scans'])
+
+
+    def test_graph_stages(self):
+        """Test that only the sort and present stages of a query on a
+        TwitterverseGraph are counted."""
+
+        graph = tg.graph_from_twv(self.twitterverse)
+
+        with tp.QueryProfile() as profile:
+            found = tg.get_search_results(graph, {'username': 'a',
+                                                  'operations': ['followers']})
+            result = ''.join(tg.iter_present_chunks(
+                graph, found, {'sort-by': 'username', 'format': 'short'}))
+        report = profile.report()
+
+        self.assertEqual("['b', 'c']", result)
+        self.assertEqual(0, report['stages']['search']['calls'])
+        self.assertEqual(1, report['stages']['sort']['calls'])
+        self.assertEqual(2, report['stages']['present']['users'])
+
+
+    def test_disable(self):
+        """Test that a disabled profile counts nothing and leaves the
+        functions of twitterverse_functions as they were."""
+
+        original = tf.get_search_results
+        profile = tp.QueryProfile()
+
+        with profile:
+            self.assertIs(original, tf.get_search_results)
+            self.assertRaises(ValueError, tp.QueryProfile().enable)
+        tf.get_search_results(self.twitterverse, {'username': 'a',
+                                                  'operations': ['followers']})
+
+        self.assertIsNone(tf.get_profiler())
+        self.assertEqual(0, profile.report()['stages']['search']['calls'])
+        self.assertEqual(3, len(tf.SORT_KEYS))
+
+
+    def test_queries(self):
+        """Test that the work of each query is reported under its name as
+        well as in the totals."""
+
+        present = {'sort-by': 'username', 'format': 'short'}
+
+        with tp.QueryProfile() as profile:
+            profile.start_query('q1')
+            tf.get_search_results(self.twitterverse,
+                                  {'username': 'a', 'operations': ['followers']})
+            profile.start_query('q2')
+            tf.get_present_string(self.twitterverse, ['c', 'b'], present)
+            profile.start_query('q1')
+            tf.get_present_string(self.twitterverse, ['a'], present)
+        report = profile.report()
+
+        self.assertEqual(['q1', 'q2'], sorted(report['queries']))
+        q1 = report['queries']['q1']
+        q2 = report['queries']['q2']
+        self.assertEqual((1, 1, 0), (q1['stages']['search']['calls'],
+                                     q1['stages']['present']['users'],
+                                     q1['sort_keys']))
+        self.assertEqual((0, 2, 2), (q2['stages']['search']['calls'],
+                                     q2['stages']['present']['users'],
+                                     q2['sort_keys']))
+        self.assertEqual(3, report['stages']['present']['users'])
+        self.assertEqual(1, report['follower_scans'])
+
+
+    def test_other_threads(self):
+        """Test that queries run in another thread while a profile is
+        enabled are not counted in it."""
+
+        with tp.QueryProfile() as profile:
+            thread = threading.Thread(
+                target=tf.get_search_results,
+                args=(self.twitterverse, {'username': 'a',
+                                          'operations': ['followers']}))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(0, profile.report()['stages']['search']['calls'])
+
+
+    def test_run_batch(self):
+        """Test that run_batch reports each query file under its name."""
+
+        directory = tempfile.mkdtemp()
+        query_filenames = []
+        for name, username in [('q1', 'a'), ('q2', 'b')]:
+            query_filename = os.path.join(directory, name)
+            query_file = open(query_filename, 'w')
+            query_file.write('SEARCH\n' + username + '\nfollowers\nFILTER\n'
+                             'PRESENT\nsort-by username\nformat short\n')
+            query_file.close()
+            query_filenames.append(query_filename)
+
+        with tp.QueryProfile() as profile:
+            program.run_batch(self.twitterverse,
+                              tf.build_follower_index(self.twitterverse),
+                              query_filenames, directory, 2,
+                              profile=profile)
+        report = profile.report()
+        shutil.rmtree(directory)
+
+        self.assertEqual(query_filenames, sorted(report['queries']))
+        self.assertEqual(2, report['queries'][query_filenames[0]]
+                         ['stages']['present']['users'])
+        self.assertEqual(1, report['queries'][query_filenames[1]]
+                         ['stages']['present']['users'])
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,177 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import twitterverse_functions as tf
+import twitterverse_program as program
+
+
+DATA = '''a
+Andy
+China
+
+ENDBIO
+END
+b
+Bert
+Germany
+http://b.ca
+Hi
+ENDBIO
+a
+END
+c
+Charles
+England
+
+ENDBIO
+a
+b
+END
+'''
+
+QUERIES = {'1_short.txt': 'SEARCH\na\nfollowers\nFILTER\nPRESENT\n'
+                          'sort-by username\nformat short\n',
+           '2_long.txt': 'SEARCH\nc\nfollowing\nFILTER\nPRESENT\n'
+                         'sort-by name\nformat long\n',
+           '3_missing.txt': 'SEARCH\nc\nFILTER\nfollower zed\nPRESENT\n'
+                            'sort-by username\nformat short\n',
+           '4_empty.txt': 'SEARCH\nb\nfollowing\nFILTER\nname-includes z\n'
+                          'PRESENT\nsort-by username\nformat short\n',
+           '5_limit.txt': 'SEARCH\na\nfollowers\nFILTER\nPRESENT\n'
+                          'sort-by popularity\nformat short\nlimit -1\n'}
+
+
+class TestRunBatch(unittest.TestCase):
+    """unittest test methods for run_batch and expand_query_filenames."""
+
+
+    def setUp(self):
+        """Write the query files to a temporary directory and load DATA."""
+
+        self.query_dir = tempfile.TemporaryDirectory()
+        for query_filename in QUERIES:
+            query_file = open(os.path.join(self.query_dir.name,
+                                           query_filename), 'w')
+            query_file.write(QUERIES[query_filename])
+            query_file.close()
+        os.mkdir(os.path.join(self.query_dir.name, 'subdir'))
+
+        self.twitterverse, self.follower_index = tf.process_data(
+            io.StringIO(DATA), True)
+        self.query_filenames = program.expand_query_filenames(
+            [self.query_dir.name])
+
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+
+        self.query_dir.cleanup()
+
+
+    def run_batch(self, output_dir=None, jobs=1):
+        """Return what run_batch writes to stdout and stderr for the query
+        files."""
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), \
+             contextlib.redirect_stderr(stderr):
+            program.run_batch(self.twitterverse, self.follower_index,
+                            self.query_filenames, output_dir, jobs)
+        return stdout.getvalue(), stderr.getvalue()
+
+
+    def test_expand_query_filenames(self):
+        """Test that a directory is replaced by its files in sorted order."""
+
+        self.assertEqual([os.path.join(self.query_dir.name, filename)
+                          for filename in sorted(QUERIES)],
+                         self.query_filenames)
+        self.assertEqual(self.query_filenames[1:2],
+                         program.expand_query_filenames(
+                             self.query_filenames[1:2]))
+
+
+    def test_headers(self):
+        """Test that each header starts a line, even after a result with no
+        trailing newline, and that a missing user and a bad limit are
+        reported."""
+
+        stdout, stderr = self.run_batch()
+        lines = stdout.split('\n')
+
+        self.assertEqual('==> {0} <=='.format(self.query_filenames[0]),
+                         lines[0])
+        self.assertEqual("['b', 'c']", lines[1])
+        self.assertEqual('==> {0} <=='.format(self.query_filenames[1]),
+                         lines[2])
+        self.assertEqual('==> {0} <=='.format(self.query_filenames[3]),
+                         lines[-3])
+        self.assertEqual(['[]', ''], lines[-2:])
+        self.assertEqual('{0}: no record for user {1}\n'
+                         '{2}: limit is not a non-negative int: -1\n'.format(
+                             self.query_filenames[2], repr('zed'),
+                             self.query_filenames[4]), stderr)
+
+
+    def test_output_dir(self):
+        """Test that each result is written to its own file as it is."""
+
+        output_dir = tempfile.TemporaryDirectory()
+        stdout, stderr = self.run_batch(output_dir.name)
+        outputs = sorted(os.listdir(output_dir.name))
+        output_file = open(os.path.join(output_dir.name, '1_short.txt.out'))
+        output = output_file.read()
+        output_file.close()
+        output_dir.cleanup()
+
+        self.assertEqual('', stdout)
+        self.assertEqual(['1_short.txt.out', '2_long.txt.out',
+                          '4_empty.txt.out'], outputs)
+        self.assertEqual("['b', 'c']", output)
+
+
+    def test_jobs(self):
+        """Test that worker processes give the same output as running the
+        queries in this process."""
+
+        self.assertEqual(self.run_batch(), self.run_batch(jobs=2))
+
+
+
+    def test_filter_order(self):
+        """Test that queries differing only in the order of their filters,
+        where one filter names a user with no record, give the same output
+        from the command line with one job and with two."""
+
+        data_file = tempfile.NamedTemporaryFile('w', delete=False)
+        data_file.write(DATA)
+        data_file.close()
+        query_filenames = []
+        for filters in ['name-includes zz\nfollower zed\n',
+                        'follower zed\nname-includes zz\n']:
+            query_filenames.append(os.path.join(
+                self.query_dir.name, str(len(query_filenames))))
+            query_file = open(query_filenames[-1], 'w')
+            query_file.write('SEARCH\na\nfollowers\nFILTER\n' + filters +
+                             'PRESENT\nsort-by username\nformat short\n')
+            query_file.close()
+
+        outputs = []
+        for jobs in ['1', '2']:
+            stdout = io.StringIO()
+            stderr = io.StringIO()
+            with contextlib.redirect_stdout(stdout), \
+                 contextlib.redirect_stderr(stderr):
+                program.main([data_file.name] + query_filenames +
+                             ['-j', jobs])
+            outputs.append((stdout.getvalue(), stderr.getvalue()))
+        os.remove(data_file.name)
+
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
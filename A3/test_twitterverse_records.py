@@ -0,0 +1,91 @@
+import io
+import unittest
+import twitterverse_functions as tf
+import twitterverse_records as tr
+
+
+DATA = '''a
+Andy
+China
+
+ENDBIO
+END
+b
+Bert
+Germany
+http://b.ca
+Hi
+there
+ENDBIO
+a
+END
+c
+Charles
+England
+
+ENDBIO
+a
+b
+zed
+END
+'''
+
+
+class TestRecordStore(unittest.TestCase):
+    """unittest test methods for RecordStore."""
+
+
+    def setUp(self):
+        """Load the same data as a Twitterverse dictionary and a store."""
+
+        self.twitterverse, self.follower_index = tf.process_data(
+            io.StringIO(DATA), True)
+        self.store = tr.process_records(io.StringIO(DATA))
+
+
+    def test_same_records(self):
+        """Test that every record reads the same as in the dictionary."""
+
+        self.assertEqual(list(self.twitterverse), list(self.store))
+        for user in self.twitterverse:
+            self.assertEqual(self.twitterverse[user], dict(self.store[user]))
+        self.assertNotIn('zed', self.store)
+        self.assertRaises(KeyError, lambda: self.store['zed'])
+
+
+    def test_follower_view(self):
+        """Test that the follower view holds the same sets as the follower
+        index."""
+
+        follower_view = self.store.follower_view()
+
+        self.assertEqual(self.follower_index, dict(follower_view))
+
+
+    def test_repeated_username(self):
+        """Test that a later record of a username replaces the earlier one,
+        edges included."""
+
+        data = DATA + ('a\nAl\nChina\n\nENDBIO\nc\nEND\n'
+                       'b\nB\n\n\nENDBIO\na\nEND\n')
+        twitterverse, follower_index = tf.process_data(io.StringIO(data),
+                                                       True)
+        store = tr.process_records(io.StringIO(data))
+
+        self.assertEqual(list(twitterverse), list(store))
+        for user in twitterverse:
+            self.assertEqual(twitterverse[user], dict(store[user]))
+        self.assertEqual(follower_index, dict(store.follower_view()))
+
+
+    def test_records_are_read_only(self):
+        """Test that a record cannot be changed."""
+
+        def set_name():
+            self.store['a']['name'] = 'Al'
+
+        self.assertRaises(TypeError, set_name)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import unittest
+import twitterverse_functions as tf
+import twitterverse_server as tsv
+
+
+QUERY = 'SEARCH\n{0}\nfollowers\nFILTER\nPRESENT\nsort-by username\n' + \
+        'format short\n\n'
+
+
+class TestQueryServer(unittest.TestCase):
+    """unittest test methods for QueryServer."""
+
+
+    def setUp(self):
+        """Create a twitterverse and its follower index."""
+
+        self.twitterverse = {'a':{'name':'Andy', 'location':'China', 'web':'',
+                                  'bio':'', 'following':[]},
+                             'b':{'name':'Bert', 'location':'Germany',
+                                  'web':'', 'bio':'', 'following':['a']},
+                             'c':{'name':'Charles', 'location':'England',
+                                  'web':'', 'bio':'', 'following':['a', 'b']}}
+        self.follower_index = tf.build_follower_index(self.twitterverse)
+
+
+    async def exchange(self, requests, max_in_flight):
+        """Start a server, send every request in requests on one connection
+        without waiting for answers, and return the raw responses."""
+
+        query_server = tsv.QueryServer(self.twitterverse, self.follower_index,
+                                       max_in_flight=max_in_flight)
+        server = await query_server.start()
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            response = await self.send(port, requests)
+        query_server.close()
+        return response
+
+
+    async def send(self, port, requests):
+        """Send every request in requests on a new connection to port and
+        return the raw responses."""
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(''.join(requests).encode())
+        await writer.drain()
+        writer.write_eof()
+        response = await reader.read()
+        writer.close()
+        return response
+
+
+    def test_pipelined_queries(self):
+        """Test that several queries on one connection are answered in
+        order."""
+
+        response = asyncio.run(self.exchange([QUERY.format('a'),
+                                              QUERY.format('b')], 1))
+
+        self.assertEqual(b"OK 10\n['b', 'c']OK 5\n['c']", response)
+
+
+    def test_bad_query(self):
+        """Test that a malformed query or a missing user is answered with an
+        error and the connection keeps working."""
+
+        response = asyncio.run(self.exchange(
+            ['SEARCH\na\nfollowing\n\n',
+             'SEARCH\na\nFILTER\nfollower zed\nPRESENT\nsort-by username\n'
+             'format short\n\n',
+             QUERY.format('b')], 2))
+
+        self.assertEqual(b"ERROR query has no FILTER section\n"
+                         b"ERROR no record for user 'zed'\n"
+                         b"OK 5\n['c']", response)
+
+
+
+    def test_concurrent_clients(self):
+        """Test that a query still running on one connection does not hold
+        up the answer to another."""
+
+        answered = threading.Event()
+        waits = []
+
+        def answer(data, follower_index, text, text_index, cache):
+            if text == QUERY.format('a'):
+                waits.append(answered.wait(5))
+            return real_answer(data, follower_index, text, text_index, cache)
+
+        async def exchange():
+            query_server = tsv.QueryServer(self.twitterverse,
+                                           self.follower_index)
+            server = await query_server.start()
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                slow = asyncio.ensure_future(self.send(port,
+                                                       [QUERY.format('a')]))
+                fast = await self.send(port, [QUERY.format('b')])
+                answered.set()
+                responses = [await slow, fast]
+            query_server.close()
+            return responses
+
+        real_answer = tsv.answer
+        tsv.answer = answer
+        try:
+            responses = asyncio.run(exchange())
+        finally:
+            tsv.answer = real_answer
+
+        self.assertEqual([b"OK 10\n['b', 'c']", b"OK 5\n['c']"], responses)
+        self.assertEqual([True], waits)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+import twitterverse_graph as tg
+import twitterverse_snapshot as ts
+
+
+class TestSnapshot(unittest.TestCase):
+    """unittest test methods for saving and loading snapshots."""
+
+
+    def setUp(self):
+        """Create a twitterverse and save it to a temporary snapshot file."""
+
+        self.twitterverse = {'a':{'name':'Andy', 'location':'China', 'web':'',
+                                  'bio':'Hi\nthere', 'following':[]},
+                             'b':{'name':'Bért', 'location':'Germany',
+                                  'web':'b.com', 'bio':'',
+                                  'following':['a', 'ghost']},
+                             'c':{'name':'Charles', 'location':'England',
+                                  'web':'', 'bio':'', 'following':['a', 'b']}}
+
+        self.snapshot_file = tempfile.TemporaryFile()
+        ts.save_snapshot(self.twitterverse, self.snapshot_file)
+        self.snapshot_file.flush()
+
+
+    def tearDown(self):
+        """Close the temporary snapshot file."""
+
+        self.snapshot_file.close()
+
+
+    def test_load_snapshot(self):
+        """Test that load_snapshot returns the saved twitterverse."""
+
+        actual = ts.load_snapshot(self.snapshot_file)
+
+        self.assertEqual(self.twitterverse, actual)
+
+
+    def test_load_graph(self):
+        """Test that load_graph returns a graph with the saved users and
+        edges, including users followed without a record."""
+
+        graph = ts.load_graph(self.snapshot_file)
+
+        self.assertEqual(['a', 'b', 'ghost', 'c'], graph.usernames)
+        self.assertEqual('Bért', graph.names[graph.ids['b']])
+        self.assertNotIn('ghost', graph)
+        self.assertEqual(['b', 'c'],
+                         tg.get_search_results(graph, {'username': 'a',
+                                               'operations': ['followers']}))
+
+
+    def test_not_a_snapshot(self):
+        """Test that load_graph rejects a file that is not a snapshot."""
+
+        data_file = tempfile.TemporaryFile()
+        data_file.write(b'a\nAndy\nChina\n\nENDBIO\nEND\n' * 4)
+        data_file.flush()
+
+        self.assertRaises(ValueError, ts.load_graph, data_file)
+
+        data_file.close()
+
+
+
+    def test_bad_header(self):
+        """Test that load_graph rejects a snapshot of another version, with
+        a non-zero reserved field or cut short."""
+
+        self.snapshot_file.seek(0)
+        snapshot = self.snapshot_file.read()
+        reserved = len(ts.MAGIC) + 4
+
+        for changed, message in [
+                (snapshot[0:len(ts.MAGIC) - 1] + b'2' +
+                 snapshot[len(ts.MAGIC):], 'version: 2'),
+                (snapshot[0:reserved] + b'\x01' + snapshot[reserved + 1:],
+                 'reserved'),
+                (snapshot[0:-1], 'truncated')]:
+            changed_file = tempfile.TemporaryFile()
+            changed_file.write(changed)
+            changed_file.flush()
+            self.assertRaisesRegex(ValueError, message, ts.load_graph,
+                                   changed_file)
+            changed_file.close()
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,152 @@
+import io
+import unittest
+import twitterverse_functions as tf
+import twitterverse_updates as tu
+
+
+DATA = '''a
+Andy
+China
+
+ENDBIO
+b
+END
+b
+Bert
+Germany
+http://b.ca
+Hi
+ENDBIO
+a
+c
+END
+c
+Charles
+England
+
+ENDBIO
+a
+b
+zed
+END
+'''
+
+
+class TestReplayDeltas(unittest.TestCase):
+    """unittest test methods for replaying deltas with twitterverse_updates."""
+
+
+    def setUp(self):
+        """Load DATA with its follower index and text index."""
+
+        self.twitterverse, self.follower_index = tf.process_data(
+            io.StringIO(DATA), True)
+        self.text_index = tf.build_text_index(self.twitterverse)
+
+
+    def replay(self, deltas):
+        """Write deltas to a delta log, replay it on the twitterverse and
+        its indexes, and check that the indexes match new ones built from
+        the updated twitterverse."""
+
+        delta_file = io.StringIO()
+        for delta in deltas:
+            tu.write_delta(delta_file, delta)
+        delta_file.seek(0)
+
+        self.assertEqual(len(deltas), tu.replay_deltas(
+            self.twitterverse, delta_file, self.follower_index,
+            self.text_index))
+        self.assertEqual(tf.build_follower_index(self.twitterverse),
+                         self.follower_index)
+        self.assertEqual(tf.build_text_index(self.twitterverse),
+                         self.text_index)
+
+
+    def test_follow_and_unfollow(self):
+        """Test following, unfollowing and following again."""
+
+        self.replay([['follow', 'a', 'c'], ['unfollow', 'c', 'a'],
+                     ['unfollow', 'b', 'a'], ['follow', 'c', 'a']])
+
+        self.assertEqual(['b', 'c'], self.twitterverse['a']['following'])
+        self.assertEqual(['c'], self.twitterverse['b']['following'])
+        self.assertEqual(['zed', 'b', 'a'],
+                         self.twitterverse['c']['following'])
+
+
+    def test_unfollow_non_edge(self):
+        """Test that unfollowing a user not followed changes nothing."""
+
+        self.replay([['unfollow', 'a', 'c'], ['unfollow', 'a', 'nobody'],
+                     ['unfollow', 'b', 'a'], ['unfollow', 'b', 'a']])
+
+        self.assertEqual(['b'], self.twitterverse['a']['following'])
+        self.assertEqual(['c'], self.twitterverse['b']['following'])
+
+
+    def test_repeated_follow(self):
+        """Test that following a user already followed changes nothing, and
+        that a user without a record can be followed and unfollowed."""
+
+        self.replay([['follow', 'a', 'b'], ['follow', 'b', 'zed'],
+                     ['follow', 'b', 'zed'], ['unfollow', 'c', 'zed']])
+
+        self.assertEqual(['b'], self.twitterverse['a']['following'])
+        self.assertEqual(['a', 'c', 'zed'],
+                         self.twitterverse['b']['following'])
+        self.assertEqual({'b'}, self.follower_index['zed'])
+
+
+    def test_unfollow_positions(self):
+        """Test that unfollowing with positions, including a user followed
+        more than once, changes a following list as unfollowing without
+        them does."""
+
+        deltas = [['unfollow', 'x', 'b'], ['follow', 'x', 'b'],
+                  ['unfollow', 'x', 'e'], ['unfollow', 'x', 'c'],
+                  ['follow', 'x', 'f'], ['unfollow', 'x', 'd']]
+        with_positions = {'x': {'following': ['b', 'c', 'b', 'd', 'b', 'e']}}
+        without_positions = {'x': {'following': ['b', 'c', 'b', 'd', 'b',
+                                                 'e']}}
+        positions = {}
+
+        for delta in deltas:
+            tu.apply_delta(with_positions, delta, positions=positions)
+            tu.apply_delta(without_positions, delta)
+            self.assertEqual(without_positions, with_positions)
+
+        self.assertEqual(['f', 'b'], with_positions['x']['following'])
+        self.assertEqual({'b': [1], 'f': [0]}, positions['x'])
+
+
+    def test_set_profile(self):
+        """Test setting names and locations, including one shared with
+        another user and one set back to its first value."""
+
+        self.replay([['add', 'd'], ['set', 'd', 'name', 'Andrea'],
+                     ['set', 'a', 'name', 'Bertrand'],
+                     ['set', 'b', 'location', 'China'],
+                     ['set', 'd', 'name', ''], ['set', 'a', 'name', 'Andy'],
+                     ['set', 'c', 'bio', 'Hello'], ['follow', 'd', 'a']])
+
+        self.assertEqual('China', self.twitterverse['b']['location'])
+        self.assertEqual('', self.twitterverse['d']['name'])
+        self.assertEqual({'a', 'b'}, tf.search_text_index(
+            self.text_index['location'], 'chi'))
+        self.assertEqual({'b', 'c', 'd'}, self.follower_index['a'])
+
+
+    def test_bad_delta(self):
+        """Test that a delta that is not valid is rejected."""
+
+        self.assertRaises(ValueError, tu.apply_delta, self.twitterverse,
+                          ['set', 'a', 'following', 'b'])
+        self.assertRaises(ValueError, tu.apply_delta, self.twitterverse,
+                          ['follow', 'a'])
+        self.assertRaises(KeyError, tu.apply_delta, self.twitterverse,
+                          ['follow', 'nobody', 'a'])
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
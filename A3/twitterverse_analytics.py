@@ -0,0 +1,240 @@
+"""
+Whole-graph statistics of a Twitterverse.
+
+The functions in this module work on a TwitterverseGraph (see
+twitterverse_graph), whose edges are int user IDs in array-backed CSR form,
+so that each statistic is computed for every user at once, in a few passes
+over the edge arrays made by C-level iterators (map, itertools,
+collections.Counter) rather than a follower scan per user. A Twitterverse
+dictionary from process_data can be converted with tg.graph_from_twv.
+
+Per-user results are array('i') buffers indexed by user ID; users that are
+followed but have no record have IDs, and statistics, too. Edges are
+counted once per distinct (follower, followed) pair, as in the follower
+index.
+"""
+
+import heapq
+import itertools
+import operator
+from array import array
+from collections import Counter
+
+import twitterverse_graph as tg
+import twitterverse_snapshot as ts
+
+
+def in_degrees(graph):
+    """(TwitterverseGraph) -> array of int
+
+    Return the number of distinct followers of each user ID in graph.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b', 'c', 'b']),\
+    ('b', 'B', '', '', '', ['c'])])
+    >>> list(in_degrees(graph))
+    [0, 1, 2]
+    """
+
+    offsets = graph.follower_offsets
+    return array('i', map(operator.sub, offsets[1:], offsets[:-1]))
+
+
+def out_degrees(graph):
+    """(TwitterverseGraph) -> array of int
+
+    Return the number of distinct users each user ID in graph is following.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b', 'c', 'b']),\
+    ('b', 'B', '', '', '', ['c'])])
+    >>> list(out_degrees(graph))
+    [2, 1, 0]
+    """
+
+    # Each follower appears once per distinct user it follows among the
+    # follower arrays, so counting its appearances counts those users.
+    degrees = array('i', bytes(4 * len(graph)))
+    for user_id, count in Counter(graph.follower_sources).items():
+        degrees[user_id] = count
+    return degrees
+
+
+def edge_targets(graph):
+    """(TwitterverseGraph) -> array of int
+
+    Return the followed user ID of each distinct edge in graph, in the order
+    of graph.follower_sources, which holds the following user IDs.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b', 'c']),\
+    ('b', 'B', '', '', '', ['c'])])
+    >>> list(edge_targets(graph)), list(graph.follower_sources)
+    ([1, 2, 2], [0, 0, 1])
+    """
+
+    return array('i', itertools.chain.from_iterable(
+        map(itertools.repeat, range(len(graph)), in_degrees(graph))))
+
+
+def mutual_counts(graph):
+    """(TwitterverseGraph) -> array of int
+
+    Return the number of other users each user ID in graph both follows
+    and is followed by. A user following itself is not counted.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b', 'c']),\
+    ('b', 'B', '', '', '', ['a']), ('c', 'C', '', '', '', ['a'])])
+    >>> list(mutual_counts(graph))
+    [2, 1, 1]
+    """
+
+    size = len(graph)
+    sources = graph.follower_sources
+    targets = edge_targets(graph)
+
+    # An edge from u to v is the int u * size + v; it is mutual iff the
+    # edge from v to u is in the set of edges too.
+    edges = set(map(operator.add, map(operator.mul, sources,
+                                      itertools.repeat(size)), targets))
+    reversed_edges = map(operator.add, map(operator.mul, targets,
+                                           itertools.repeat(size)), sources)
+    mutual = edges.intersection(reversed_edges)
+    # A self-follow, from u to u, is the int u * (size + 1).
+    mutual.difference_update(map(operator.mul, range(size),
+                                 itertools.repeat(size + 1)))
+
+    counts = array('i', bytes(4 * size))
+    for user_id, count in Counter(map(operator.floordiv, mutual,
+                                      itertools.repeat(size))).items():
+        counts[user_id] = count
+    return counts
+
+
+def reach(graph, user_id, k, direction='following'):
+    """(TwitterverseGraph, int, int, str) -> set of int
+
+    Return the IDs of the users other than user_id that can be reached from
+    user_id in at most k steps of the search operation direction
+    ('following' or 'followers') in graph.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b']),\
+    ('b', 'B', '', '', '', ['c']), ('c', 'C', '', '', '', ['a'])])
+    >>> sorted(reach(graph, 0, 1)), sorted(reach(graph, 0, 2))
+    ([1], [1, 2])
+    >>> sorted(reach(graph, 0, 1, 'followers'))
+    [2]
+    """
+
+    if direction == 'following':
+        neighbours = graph.following
+    else:
+        neighbours = graph.followers
+
+    seen = set([user_id])
+    frontier = [user_id]
+    for step in range(k):
+        next_frontier = set()
+        for frontier_id in frontier:
+            next_frontier.update(neighbours(frontier_id))
+        next_frontier.difference_update(seen)
+        if len(next_frontier) == 0:
+            break
+        seen.update(next_frontier)
+        frontier = next_frontier
+
+    seen.discard(user_id)
+    return seen
+
+
+def reach_sizes(graph, k, direction='following', user_ids=None):
+    """(TwitterverseGraph, int, str, iterable of int) -> dict of {int: int}
+
+    Return a dict mapping each ID in user_ids, or every user ID in graph if
+    it is None, to the number of users it reaches in at most k steps of
+    direction, as found by reach. Each user takes a search of its own, so
+    on large graphs pass a sample of user_ids.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b']),\
+    ('b', 'B', '', '', '', ['c']), ('c', 'C', '', '', '', [])])
+    >>> reach_sizes(graph, 2)
+    {0: 2, 1: 1, 2: 0}
+    """
+
+    if user_ids is None:
+        user_ids = range(len(graph))
+
+    sizes = {}
+    for user_id in user_ids:
+        sizes[user_id] = len(reach(graph, user_id, k, direction))
+    return sizes
+
+
+def degree_distribution(degrees):
+    """(array of int) -> dict of {int: int}
+
+    Return a dict mapping each degree in degrees to the number of users
+    with that degree, in increasing order of degree.
+
+    >>> degree_distribution(array('i', [2, 0, 2, 1]))
+    {0: 1, 1: 1, 2: 2}
+    """
+
+    counts = Counter(degrees)
+    return dict((degree, counts[degree]) for degree in sorted(counts))
+
+
+def top_users(graph, values, k):
+    """(TwitterverseGraph, array of int, int) -> list of (str, int)
+
+    Return the usernames and values of the k user IDs with the largest
+    values in graph, largest first; ties go to the smaller username.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['c']),\
+    ('b', 'B', '', '', '', ['c', 'a'])])
+    >>> top_users(graph, in_degrees(graph), 2)
+    [('c', 2), ('a', 1)]
+    """
+
+    top_ids = heapq.nsmallest(k, range(len(graph)), key=lambda user_id:
+                              (-values[user_id], graph.usernames[user_id]))
+    return [(graph.usernames[user_id], values[user_id])
+            for user_id in top_ids]
+
+
+def summary(graph):
+    """(TwitterverseGraph) -> dict of {str: object}
+
+    Return whole-graph statistics of graph: the number of user IDs, of users
+    with a record and of distinct edges, the largest and mean in-degree,
+    and the number of mutually following pairs.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b', 'c']),\
+    ('b', 'B', '', '', '', ['a'])])
+    >>> summary(graph)['mutual_pairs'], summary(graph)['max_in_degree']
+    (1, 1)
+    """
+
+    degrees = in_degrees(graph)
+    edges = len(graph.follower_sources)
+    return {'users': len(graph), 'records': sum(graph.has_record),
+            'edges': edges, 'max_in_degree': max(degrees, default=0),
+            'mean_in_degree': edges / len(graph) if len(graph) > 0 else 0.0,
+            'mutual_pairs': sum(mutual_counts(graph)) // 2}
+
+
+if __name__ == '__main__':
+
+    data_filename = input('Data file: ')
+    data_file = open(data_filename, 'rb')
+    if data_file.read(len(ts.MAGIC)) == ts.MAGIC:
+        graph = ts.load_graph(data_file)
+    else:
+        data_file.close()
+        data_file = open(data_filename, 'r')
+        graph = tg.process_graph(data_file)
+    data_file.close()
+
+    statistics = summary(graph)
+    for key in statistics:
+        print('{0}: {1}'.format(key, statistics[key]))
+    print('most followed:', top_users(graph, in_degrees(graph), 10))
+    print('following most:', top_users(graph, out_degrees(graph), 10))
+    print('most mutual:', top_users(graph, mutual_counts(graph), 10))
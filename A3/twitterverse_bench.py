@@ -0,0 +1,355 @@
+"""
+Benchmarks for the Twitterverse query pipeline.
+
+generate_data writes a synthetic data file in the same format as data.txt,
+where the number of followers of each user follows a power law: the user
+of popularity rank r is followed with weight 1 / (r + 1) ** exponent.
+generate_queries makes queries using every search operation and filter.
+
+run_benchmarks times process_data, the index builders, get_search_results,
+get_filter_results and get_present_string over those queries, and reports
+the latency of each stage, its throughput in users handled per second and,
+optionally, its peak memory use as measured by tracemalloc.
+
+Run this module to benchmark a generated data set, for example:
+
+    python twitterverse_bench.py --users 100000 --queries 200 --memory
+"""
+
+import argparse
+import bisect
+import io
+import itertools
+import random
+import time
+import tracemalloc
+
+import twitterverse_functions as tf
+
+SYLLABLES = ['an', 'ber', 'cho', 'da', 'el', 'fi', 'go', 'ha', 'is', 'jo',
+             'ka', 'li', 'mo', 'na', 'or', 'pe', 'qui', 'ro', 'sa', 'tu']
+LOCATIONS = ['Toronto, ON', 'Vancouver, BC', 'Los Angeles, CA', 'London',
+             'New York, NY', 'Berlin', 'Tokyo', 'Sydney', 'Paris', '']
+WORDS = ['love', 'music', 'news', 'official', 'tweets', 'fan', 'writer',
+         'coffee', 'science', 'sports', 'travel', 'food', 'art', 'code']
+
+
+def _make_name(rng):
+    """(Random) -> str
+
+    Return a random capitalized name made of syllables.
+    """
+
+    return ''.join(rng.choice(SYLLABLES)
+                   for i in range(rng.randint(2, 4))).capitalize()
+
+
+def generate_data(data_file, user_count, mean_following=20, exponent=1.0,
+                  seed=0):
+    """(file open for writing, int, int, float, int) -> list of str
+
+    Write user_count synthetic users to data_file in data file format and
+    return their usernames. Each user follows about mean_following others,
+    chosen by a power law with the given exponent.
+
+    >>> data_file = io.StringIO()
+    >>> usernames = generate_data(data_file, 50, 5, seed=1)
+    >>> data_file.seek(0)
+    0
+    >>> twv = tf.process_data(data_file)
+    >>> sorted(twv) == sorted(usernames)
+    True
+    """
+
+    rng = random.Random(seed)
+    usernames = ['{0}{1}'.format(_make_name(rng).lower(), i)
+                 for i in range(user_count)]
+
+    # Popularity ranks are shuffled so that popular users are spread
+    # through the file.
+    by_rank = list(usernames)
+    rng.shuffle(by_rank)
+    cumulative_weights = list(itertools.accumulate(
+        1 / (rank + 1) ** exponent for rank in range(user_count)))
+    total_weight = cumulative_weights[-1]
+
+    for username in usernames:
+        following = []
+        seen = set([username])
+        count = min(user_count - 1, int(rng.expovariate(1 / mean_following)))
+        # Give up on the rare user whose picks keep landing on repeats.
+        for attempt in range(count * 4):
+            if len(following) == count:
+                break
+            followed = by_rank[bisect.bisect_left(
+                cumulative_weights, rng.random() * total_weight)]
+            if followed not in seen:
+                seen.add(followed)
+                following.append(followed)
+
+        bio = '\n'.join(' '.join(rng.choice(WORDS)
+                                 for i in range(rng.randint(3, 10)))
+                        for line in range(rng.randint(0, 3)))
+        data_file.write('{0}\n{1} {2}\n{3}\nhttp://www.{0}.com\n'.format(
+            username, _make_name(rng), _make_name(rng),
+            rng.choice(LOCATIONS)))
+        if bio != '':
+            data_file.write(bio + '\n')
+        data_file.write('ENDBIO\n')
+        for followed in following:
+            data_file.write(followed + '\n')
+        data_file.write('END\n')
+
+    return usernames
+
+
+def generate_queries(usernames, query_count, seed=0):
+    """(list of str, int, int) -> list of query dictionary
+
+    Return query_count random queries starting at users in usernames, using
+    every search operation, filter, sort order and format.
+
+    >>> queries = generate_queries(['a', 'b'], 3)
+    >>> len(queries), sorted(queries[0])
+    (3, ['filter', 'present', 'search'])
+    """
+
+    rng = random.Random(seed)
+    queries = []
+
+    for i in range(query_count):
+        operations = [rng.choice(['following', 'followers', 'following',
+                                  'followers', 'mutual', 'following*2',
+                                  'path-to ' + rng.choice(usernames)])
+                      for j in range(rng.randint(1, 3))]
+        filter_dict = {}
+        if rng.random() < 0.5:
+            filter_dict['name-includes'] = rng.choice(SYLLABLES)
+        if rng.random() < 0.5:
+            filter_dict['location-includes'] = rng.choice(
+                ['on', 'CA', 'lon', 'to', 'ber'])
+        if rng.random() < 0.3:
+            filter_dict['follower'] = rng.choice(usernames)
+        if rng.random() < 0.3:
+            filter_dict['following'] = rng.choice(usernames)
+        queries.append({'search': {'username': rng.choice(usernames),
+                                   'operations': operations},
+                        'filter': filter_dict,
+                        'present': {'sort-by': rng.choice(['username',
+                                                           'name',
+                                                           'popularity']),
+                                    'format': rng.choice(['long',
+                                                          'short'])}})
+
+    return queries
+
+
+def write_query(query_file, query):
+    """(file open for writing, query dictionary) -> NoneType
+
+    Write query to query_file in the query file format read by
+    process_query.
+
+    >>> query_file = io.StringIO()
+    >>> write_query(query_file, generate_queries(['a'], 1)[0])
+    >>> query_file.seek(0)
+    0
+    >>> sorted(tf.process_query(query_file))
+    ['filter', 'present', 'search']
+    """
+
+    query_file.write('SEARCH\n{0}\n'.format(query['search']['username']))
+    for search_operation in query['search']['operations']:
+        query_file.write(search_operation + '\n')
+    query_file.write('FILTER\n')
+    for filter_operation in query['filter']:
+        query_file.write('{0} {1}\n'.format(
+            filter_operation, query['filter'][filter_operation]))
+    query_file.write('PRESENT\n')
+    for key in query['present']:
+        query_file.write('{0} {1}\n'.format(key, query['present'][key]))
+
+
+class StageStats:
+    """Timings of the runs of one pipeline stage."""
+
+    def __init__(self, name):
+        """(StageStats, str) -> NoneType
+
+        Initialize stats for the stage called name, with no runs.
+        """
+
+        self.name = name
+        self.times = []
+        self.users = 0
+        self.peak_memory = None
+
+    def add_run(self, seconds, users):
+        """(StageStats, float, int) -> NoneType
+
+        Record a run that took seconds and handled users users.
+        """
+
+        self.times.append(seconds)
+        self.users += users
+
+    def report(self):
+        """(StageStats) -> str
+
+        Return a line summarizing this stage's runs, which only names the
+        stage if it has none.
+
+        >>> StageStats('search').report()
+        'search               runs      0'
+        """
+
+        if len(self.times) == 0:
+            return '{0:<20} runs {1:>6}'.format(self.name, 0)
+
+        times = sorted(self.times)
+        total = sum(times)
+        line = '{0:<20} runs {1:>6}  mean {2:>9.3f} ms  p95 {3:>9.3f} ms  ' \
+               '{4:>12.0f} users/s'.format(
+                   self.name, len(times), total / len(times) * 1000,
+                   times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+                   self.users / total if total > 0 else 0)
+        if self.peak_memory is not None:
+            line += '  peak {0:>9.1f} MiB'.format(self.peak_memory / 2 ** 20)
+        return line
+
+
+def _timed(stats, function, *args):
+    """(StageStats, function, object) -> object
+
+    Call function with args, record the time it took in stats and return
+    its result.
+    """
+
+    start = time.perf_counter()
+    result = function(*args)
+    stats.add_run(time.perf_counter() - start, 0)
+    return result
+
+
+def run_benchmarks(data_text, queries, measure_memory=False):
+    """(str, list of query dictionary, bool) -> list of StageStats
+
+    Run every pipeline stage on the data file contents data_text and on each
+    query in queries, and return the stats of each stage. If measure_memory
+    is True, each stage is run once more under tracemalloc to find its peak
+    memory use.
+
+    >>> data_file = io.StringIO()
+    >>> usernames = generate_data(data_file, 30, 3)
+    >>> stats = run_benchmarks(data_file.getvalue(),\
+    generate_queries(usernames, 5))
+    >>> [stage.name for stage in stats]
+    ['process_data', 'build_indexes', 'get_search_results', \
+'get_filter_results', 'get_present_string']
+    """
+
+    parse = StageStats('process_data')
+    indexes = StageStats('build_indexes')
+    search = StageStats('get_search_results')
+    filtering = StageStats('get_filter_results')
+    present = StageStats('get_present_string')
+
+    twv = _timed(parse, tf.process_data, io.StringIO(data_text))
+    parse.users = len(twv)
+    follower_index, text_index = _timed(
+        indexes, lambda: (tf.build_follower_index(twv),
+                          tf.build_text_index(twv)))
+    indexes.users = len(twv)
+
+    for query in queries:
+        start = time.perf_counter()
+        search_results = tf.get_search_results(twv, query['search'],
+                                               follower_index)
+        search.add_run(time.perf_counter() - start, len(search_results))
+
+        # Users followed without a record cannot be filtered by name.
+        search_results = [user for user in search_results if user in twv]
+        start = time.perf_counter()
+        try:
+            filtered_results = tf.get_filter_results(
+                twv, search_results, query['filter'], follower_index,
+                text_index)
+        except KeyError:
+            filtered_results = []
+        filtering.add_run(time.perf_counter() - start, len(search_results))
+
+        start = time.perf_counter()
+        tf.get_present_string(twv, filtered_results, query['present'],
+                              follower_index)
+        present.add_run(time.perf_counter() - start, len(filtered_results))
+
+    if measure_memory:
+        parse.peak_memory = _peak_memory(tf.process_data,
+                                         io.StringIO(data_text))
+        indexes.peak_memory = _peak_memory(
+            lambda: (tf.build_follower_index(twv), tf.build_text_index(twv)))
+        query = max(queries, key=lambda query: len(query['search']
+                                                   ['operations']))
+        search.peak_memory = _peak_memory(tf.get_search_results, twv,
+                                          query['search'], follower_index)
+        users = [user for user in twv]
+        filtering.peak_memory = _peak_memory(
+            tf.get_filter_results, twv, users,
+            {'name-includes': 'a', 'location-includes': 'o'},
+            follower_index, text_index)
+        present.peak_memory = _peak_memory(
+            tf.get_present_string, twv, users,
+            {'sort-by': 'popularity', 'format': 'long'}, follower_index)
+
+    return [parse, indexes, search, filtering, present]
+
+
+def _peak_memory(function, *args):
+    """(function, object) -> int
+
+    Call function with args and return the peak number of bytes allocated
+    while it ran.
+    """
+
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Twitterverse pipeline on synthetic data.')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--following', type=int, default=20,
+                        help='mean number of users each user follows')
+    parser.add_argument('--exponent', type=float, default=1.0,
+                        help='power law exponent of follower counts')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true',
+                        help='also measure peak memory of each stage')
+    parser.add_argument('--write-data',
+                        help='also save the generated data file here')
+    options = parser.parse_args()
+    if options.users < 1:
+        parser.error('--users must be at least 1')
+    if options.queries < 1:
+        parser.error('--queries must be at least 1')
+
+    data_file = io.StringIO()
+    usernames = generate_data(data_file, options.users, options.following,
+                              options.exponent, options.seed)
+    if options.write_data is not None:
+        output_file = open(options.write_data, 'w')
+        output_file.write(data_file.getvalue())
+        output_file.close()
+
+    for stats in run_benchmarks(data_file.getvalue(),
+                                generate_queries(usernames, options.queries,
+                                                 options.seed),
+                                options.memory):
+        print(stats.report())
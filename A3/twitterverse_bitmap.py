@@ -0,0 +1,53 @@
+"""
+Bitmap sets of user IDs.
+
+A bitmap is an int whose bit i is set iff user ID i (see twitterverse_graph)
+is in the set. Python ints are arrays of machine words, so the union,
+intersection and difference of two bitmaps (a | b, a & b, a & ~b) each
+take one C-level pass over the words, however many users the sets hold,
+instead of a hash lookup per user.
+
+Bitmaps are built from user IDs, and tested for them, a byte at a time
+through a bytearray or bytes, since setting or testing single bits of a
+large int copies the whole int.
+"""
+
+
+def from_ids(user_ids):
+    """(iterable of int) -> int
+
+    Return the bitmap of the user IDs in user_ids.
+
+    >>> bin(from_ids([0, 3, 3, 9]))
+    '0b1000001001'
+    """
+
+    bits = bytearray()
+    for user_id in user_ids:
+        byte = user_id >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        bits[byte] |= 1 << (user_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def member_test(bitmap):
+    """(int) -> function
+
+    Return a function that takes a user ID and returns True iff it is in
+    bitmap, in constant time.
+
+    >>> is_member = member_test(from_ids([2, 10]))
+    >>> [is_member(user_id) for user_id in [2, 3, 10, 99]]
+    [True, False, True, False]
+    """
+
+    bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    size = len(bits)
+    return lambda user_id: (user_id >> 3 < size and
+                            bits[user_id >> 3] >> (user_id & 7) & 1 == 1)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
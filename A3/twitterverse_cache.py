@@ -0,0 +1,164 @@
+"""
+Memoized search and filter results for a Twitterverse.
+
+A QueryCache remembers the results of get_search_results and
+get_filter_results on one Twitterverse dictionary, keyed on a normalized,
+hashable form of the search and filter specification dictionaries, so that
+queries sharing a search block, or repeated outright, are only run once.
+
+The least recently used results are evicted once the cache holds more than
+max_entries results or their lists take more than max_bytes bytes. The
+cache is cleared whenever twitterverse_updates changes its twitterverse;
+changes made to the dictionary directly are not seen.
+
+A cache may be shared by threads running queries at once. Results are
+computed outside its lock, so two threads missing on the same key may both
+compute it.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+import twitterverse_functions as tf
+import twitterverse_updates as tu
+
+
+def search_key(search_dict):
+    """(search specification dictionary) -> tuple
+
+    Return a hashable key equal for search specifications with the same
+    results. Operations that are not search operations are ignored by
+    get_search_results, so they are left out.
+
+    >>> search_key({'username': 'a', 'operations': ['following', 'x']})
+    ('a', ('following',))
+    """
+
+    return (search_dict['username'],
+            tuple(search_operation for search_operation in
+                  search_dict['operations']
+                  if tf.is_search_operation(search_operation)))
+
+
+def filter_key(filter_dict):
+    """(filter specification dictionary) -> tuple
+
+    Return a hashable key equal for filter specifications with the same
+    results. The filters are kept in the order given, since a filter naming
+    a user with no record may or may not raise KeyError depending on the
+    filters before it.
+
+    >>> filter_key({'name-includes': 'a', 'follower': 'b'})
+    (('name-includes', 'a'), ('follower', 'b'))
+    """
+
+    return tuple(filter_dict.items())
+
+
+class QueryCache:
+    """An LRU cache of search and filter results on one twitterverse."""
+
+    def __init__(self, twv, follower_index=None, text_index=None,
+                 max_entries=1024, max_bytes=64 * 1024 * 1024):
+        """(QueryCache, Twitterverse dictionary, follower index, text index,
+            int, int) -> NoneType
+
+        Initialize an empty cache of results on twitterverse twv, computed
+        with the given indexes.
+        """
+
+        self.twv = twv
+        self.follower_index = follower_index
+        self.text_index = text_index
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.results = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        tu.add_listener(self.on_update)
+
+    def on_update(self, twv):
+        """(QueryCache, Twitterverse dictionary) -> NoneType
+
+        Clear this cache if twv is its twitterverse.
+        """
+
+        if twv is self.twv:
+            self.clear()
+
+    def clear(self):
+        """(QueryCache) -> NoneType
+
+        Remove every result from this cache.
+        """
+
+        with self.lock:
+            self.results.clear()
+            self.size = 0
+
+    def _lookup(self, key, compute):
+        """(QueryCache, tuple, function) -> list of str
+
+        Return a copy of the result stored for key, first storing the result
+        of calling compute if there is none.
+        """
+
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                self.results.move_to_end(key)
+                return list(self.results[key])
+            self.misses += 1
+
+        result = compute()
+        stored = list(result)
+        if sys.getsizeof(stored) > self.max_bytes:
+            return result
+
+        with self.lock:
+            if key in self.results:
+                self.size -= sys.getsizeof(self.results[key])
+            self.results[key] = stored
+            self.size += sys.getsizeof(stored)
+            while len(self.results) > self.max_entries or \
+                  self.size > self.max_bytes:
+                evicted_key, evicted = self.results.popitem(last=False)
+                self.size -= sys.getsizeof(evicted)
+        return result
+
+    def get_search_results(self, search_dict):
+        """(QueryCache, search specification dictionary) -> list of str
+
+        Return get_search_results for search_dict on this cache's
+        twitterverse, from the cache if possible.
+        """
+
+        return self._lookup(('search', search_key(search_dict)),
+                            lambda: tf.get_search_results(
+                                self.twv, search_dict, self.follower_index))
+
+    def get_filter_results(self, search_dict, filter_dict):
+        """(QueryCache, search specification dictionary,
+            filter specification dictionary) -> list of str
+
+        Return get_filter_results for filter_dict on the search results of
+        search_dict on this cache's twitterverse, from the cache if
+        possible.
+        """
+
+        return self._lookup(('filter', search_key(search_dict),
+                             filter_key(filter_dict)),
+                            lambda: tf.get_filter_results(
+                                self.twv,
+                                self.get_search_results(search_dict),
+                                filter_dict, self.follower_index,
+                                self.text_index))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -20,6 +20,7 @@ Query dictionary: dict of {str: dict of {str: object}}
 Search specification dictionary: dict of {str: object}
    - key "username", value represents the username to begin search at (a str)
    - key "operations", value represents the operations to perform (a list of str)
+     (see is_search_operation for the operations)
 
 Filter specification dictionary: dict of {str: str}
    - key "following" might exist, value represents a username (a str)
@@ -30,58 +31,371 @@ Filter specification dictionary: dict of {str: str}
 Presentation specification dictionary: dict of {str: str}
    - key "sort-by", value represents how to sort results (a str)
    - key "format", value represents how to format results (a str)
+   - key "limit" might exist, value represents the most results to present 
+     (a str of an int)
+
+Follower index: dict of {str: set of str}
+   - each key is a username (a str)
+   - each value is the set of usernames of users following that user
+
+Text index: dict of {str: dict of {str: dict}}
+   - key "name", value represents a field index of users' names
+   - key "location", value represents a field index of users' locations
+
+Field index: dict of {str: dict}
+   - key "lowered", value maps each username to its field, lowercased 
+     (a dict of {str: str})
+   - key "ngrams", value maps each NGRAM_SIZE-character substring of a 
+     lowercased field to the usernames whose field contains it 
+     (a dict of {str: set of str})
        
 """
 
 # Write your Twitterverse functions here
 
+import heapq
+import threading
+import time
+from functools import cmp_to_key, wraps
+
 # Variable twv is short for twitterverse dictionary.
 
+# The profiler each thread reports the stages of its queries to, if any.
+_profiling = threading.local()
+
 
-def process_data(data_file):
-    """(file open for reading) -> Twitterverse dictionary
+def set_profiler(profiler):
+    """(object) -> NoneType
     
-    Read data_file and return twv in Twitterverse dictionary format.
+    Report the stages of the queries run in this thread to profiler from now 
+    on, or to no profiler if profiler is None. profiler must have the 
+    methods record(stage, calls, seconds, users) and count(counter, count), 
+    as twitterverse_profile.QueryProfile does.
     """
     
-    twv = {}
-    username = data_file.readline().strip()
+    _profiling.profiler = profiler
     
-    while username != '':
-        
-        twv[username] = {}
-        twv_sub = {'name':'', 'location':'', 'web':'', 'bio':'',
-                            'following':[]}
-        twv_sub['name'] += data_file.readline().strip()
-        twv_sub['location'] += data_file.readline().strip()
-        twv_sub['web'] += data_file.readline().strip()    
+    
+def get_profiler():
+    """() -> object
+    
+    Return the profiler set by set_profiler in this thread, or None.
+    """
+    
+    return getattr(_profiling, 'profiler', None)
+
+
+def profiled(stage, count_users):
+    """(str, function) -> function
+    
+    Return a decorator making a function report each call to the profiler 
+    of the thread calling it, if there is one, as a call in stage handling 
+    count_users(args, result) users, where args are its positional 
+    arguments. With no profiler, the function is called straight away.
+    """
+    
+    def decorate(function):
         
-        # Knowing the order the data appears in data_file ensures the proper 
-        # placement of data into dictionary format without evaluating it.
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = getattr(_profiling, 'profiler', None)
+            if profiler is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            users = 0
+            try:
+                result = function(*args, **kwargs)
+                users = count_users(args, result)
+            finally:
+                profiler.record(stage, 1, time.perf_counter() - start, users)
+            return result
         
-        line = data_file.readline() 
-        while line != 'ENDBIO\n':
-            twv_sub['bio'] += line
-            line = data_file.readline()
-        twv_sub['bio'] = twv_sub['bio'][0:-1]
+        return wrapper
+    
+    return decorate
+
+
+def _profiled_chunks(stage):
+    """(str) -> function
+    
+    Return a decorator making a generator function taking a twitterverse 
+    and a list of users report each call to the profiler of the thread 
+    calling it, if there is one, as a call in stage handling those users, 
+    and the time taken to produce each piece it yields as time in stage.
+    """
+    
+    def decorate(function):
         
-        # Does not call method strip on above lines to keep the line exactly 
-        # the same as in the data file.
+        @wraps(function)
+        def wrapper(twv, users, *args, **kwargs):
+            profiler = getattr(_profiling, 'profiler', None)
+            if profiler is None:
+                return function(twv, users, *args, **kwargs)
+            profiler.record(stage, 1, 0.0, len(users))
+            return _timed_chunks(profiler, stage, 
+                                 function(twv, users, *args, **kwargs))
         
-        line = data_file.readline().strip()    
-        while line != 'END':
-            twv_sub['following'].append(line)
-            line = data_file.readline().strip()
+        return wrapper
+    
+    return decorate
+
+
+def _timed_chunks(profiler, stage, chunks):
+    """(object, str, generator of str) -> generator of str
+    
+    Yield the pieces of chunks, recording the time taken to produce each 
+    one as time in stage of profiler.
+    """
+    
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            profiler.record(stage, 0, time.perf_counter() - start, 0)
+        yield chunk
+
+
+def _count(counter, count=1):
+    """(str, int) -> NoneType
+    
+    Add count to counter counter of the profiler of this thread, if any.
+    """
+    
+    profiler = getattr(_profiling, 'profiler', None)
+    if profiler is not None:
+        profiler.count(counter, count)
+
+
+@profiled('parse', lambda args, result: len(result[0]) 
+          if isinstance(result, tuple) else len(result))
+
+def process_data(data_file, build_index=False):
+    """(file open for reading, bool) -> Twitterverse dictionary
+    
+    Read data_file and return twv in Twitterverse dictionary format. If 
+    build_index is True, return a tuple (twv, follower index) instead, where
+    the follower index is built by build_follower_index.
+    """
+    
+    twv = {}
+    
+    for username, twv_sub in iter_users(data_file):
         twv[username] = twv_sub
-        username = data_file.readline().strip()
         
+    if build_index:
+        return twv, build_follower_index(twv)
+    
     return twv
 
 
+# Length of the substrings indexed by build_text_index.
+NGRAM_SIZE = 3
+
+# Number of characters iter_users reads from a data file at a time.
+CHUNK_SIZE = 1 << 20
+
+
+def iter_users(data_file, chunk_size=CHUNK_SIZE):
+    """(file open for reading, int) -> generator of (str, dict of {str: object})
+    
+    Yield a (username, user dictionary) tuple for each user in data_file, in 
+    file order, where the user dictionary is the value process_data would 
+    store for username. data_file is read chunk_size characters at a time, 
+    so only about one chunk is held in memory.
+    
+    >>> import io
+    >>> data_file = io.StringIO('a\\nA\\nTO\\nweb\\nHi\\nEND\\nENDBIO\\nb\\nEND\\n'\
+    'b\\nB\\n\\n\\nENDBIO\\nEND')
+    >>> for username, user in iter_users(data_file, 8):
+    ...     print(username, user['name'], repr(user['bio']), user['following'])
+    a A 'Hi\\nEND' ['b']
+    b B '' []
+    """
+    
+    text = ''
+    chunk = data_file.read(chunk_size)
+    
+    while chunk != '':
+        text += chunk
+        position = 0
+        for username, twv_sub, position in _parse_users(text):
+            if username == '':
+                return
+            yield username, twv_sub
+        text = text[position:]
+        chunk = data_file.read(chunk_size)
+        
+    # The last line of the file may be missing its newline.
+    
+    text += '\n'
+    parsed = _parse_user(text, 0)
+    while parsed is not None and parsed[0] != '':
+        yield parsed[0], parsed[1]
+        parsed = _parse_user(text, parsed[2])
+
+
+def _parse_users(text):
+    """(str) -> generator of (str, dict of {str: object}, int)
+    
+    Yield a (username, user dictionary, next index) tuple for each complete 
+    user record at the start of text, which holds data file contents. The 
+    username is '' if there are no more users.
+    """
+    
+    # Split text on the 'END' lines in bulk, and only parse a record line by 
+    # line when its piece is not a whole record in the usual layout.
+    
+    pieces = text.split('\nEND\n')
+    position = 0
+    piece_start = 0
+    
+    for piece in pieces[0:-1]:
+        piece_end = piece_start + len(piece) + len('\nEND\n')
+        
+        if piece_start == position:
+            parsed = _parse_piece(piece)
+            if parsed is not None:
+                position = piece_end
+                yield parsed[0], parsed[1], position
+                
+        while position < piece_end:
+            parsed = _parse_user(text, position)
+            if parsed is None:
+                return
+            position = parsed[2]
+            yield parsed
+            
+        piece_start = piece_end
+
+
+def _parse_piece(piece):
+    """(str) -> (str, dict of {str: object}) or NoneType
+    
+    Return the (username, user dictionary) tuple of the user record in piece, 
+    which is the text of one record before its 'END' line. The username is 
+    '' if there are no more users. Return None if piece is not laid out as 
+    a single record.
+    """
+    
+    head, endbio, following = piece.partition('\nENDBIO')
+    fields = head.split('\n', 4)
+    
+    if fields[0].strip() == '':
+        return '', None
+    if endbio == '' or len(fields) < 4 or following[0:1] not in ('', '\n'):
+        return None
+    
+    following = [line.strip() for line in following.split('\n')[1:]]
+    if 'END' in following:
+        return None
+    
+    twv_sub = {'name': fields[1].strip(), 'location': fields[2].strip(), 
+               'web': fields[3].strip(), 'bio': '', 'following': following}
+    if len(fields) == 5:
+        twv_sub['bio'] = fields[4]
+        
+    return fields[0].strip(), twv_sub
+
+
+def _parse_user(text, position):
+    """(str, int) -> (str, dict of {str: object}, int) or NoneType
+    
+    Parse the user record starting at index position of text, which holds 
+    data file contents, line by line and return a (username, user 
+    dictionary, next index) tuple. The username is '' if there are no more 
+    users. Return None if text ends before the record does.
+    """
+    
+    line_ends = []
+    line_end = position - 1
+    for i in range(4):
+        line_end = text.find('\n', line_end + 1)
+        if line_end == -1:
+            return None
+        line_ends.append(line_end)
+        if i == 0 and text[position:line_end].strip() == '':
+            return '', None, line_end + 1
+        
+    # Knowing the order the data appears in text ensures the proper 
+    # placement of data into dictionary format without evaluating it.
+    
+    bio_end = text.find('\nENDBIO\n', line_ends[3])
+    if bio_end == -1:
+        return None
+    
+    # The bio is not stripped, to keep it exactly the same as in the file.
+    
+    twv_sub = {'name': text[line_ends[0] + 1:line_ends[1]].strip(), 
+               'location': text[line_ends[1] + 1:line_ends[2]].strip(), 
+               'web': text[line_ends[2] + 1:line_ends[3]].strip(),
+               'bio': text[line_ends[3] + 1:bio_end], 
+               'following': []}
+    
+    following_start = bio_end + len('\nENDBIO\n')
+    search_start = following_start
+    while True:
+        end_start = text.find('END', search_start)
+        if end_start == -1:
+            return None
+        line_start = text.rfind('\n', following_start - 1, end_start) + 1
+        line_end = text.find('\n', end_start)
+        if line_end == -1:
+            return None
+        if text[line_start:line_end].strip() == 'END':
+            break
+        search_start = line_end
+        
+    if line_start > following_start:
+        for line in text[following_start:line_start - 1].split('\n'):
+            twv_sub['following'].append(line.strip())
+        
+    return text[position:line_ends[0]].strip(), twv_sub, line_end + 1
+
+
+def build_follower_index(twv):
+    """(Twitterverse dictionary) -> follower index
+    
+    Return a follower index for twitterverse twv, mapping each username that 
+    is followed by at least one user to the set of users following it.
+    
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['a']},\
+    'c':{'name':'C', 'location':'', 'web':'', 'bio':'',\
+    'following':['a', 'b', 'a']}}
+    >>> follower_index = build_follower_index(twv)
+    >>> sorted(follower_index['a'])
+    ['b', 'c']
+    >>> 'c' in follower_index
+    False
+    """
+    
+    follower_index = {}
+    
+    for user in twv:
+        for followed in twv[user]['following']:
+            if followed not in follower_index:
+                follower_index[followed] = set()
+            follower_index[followed].add(user)
+            
+    return follower_index
+
+
 def process_query(query_file):
     """(file open for reading) -> query dictionary
     
     Read query_file and return query_dict in query dictionary format. 
+    Raise ValueError if its presentation limit is not a non-negative int.
+    
+    >>> import io
+    >>> process_query(io.StringIO('SEARCH\\na\\nFILTER\\nPRESENT\\n'\
+    'sort-by username\\nformat short\\nlimit ten\\n'))
+    Traceback (most recent call last):
+    ...
+    ValueError: limit is not a non-negative int: ten
     """
     
     query_dict = {'search':{'username':'', 'operations':[]},'filter':{}, 
@@ -105,15 +419,93 @@ def process_query(query_file):
         filter_line = line.split()
         query_dict['present'][filter_line[0]] = filter_line[1]
         line = query_file.readline().strip() 
+    
+    if 'limit' in query_dict['present'] and \
+       not query_dict['present']['limit'].isdecimal():
+        raise ValueError('limit is not a non-negative int: {0}'.format(
+            query_dict['present']['limit']))
         
     return query_dict
 
 
-def all_followers(twv, username):
-    """(Twitterverse dictionary, str) -> list of str
+def build_text_index(twv):
+    """(Twitterverse dictionary) -> text index
+    
+    Return a text index of the names and locations of the users in 
+    twitterverse twv, for the name-includes and location-includes filters.
+    Fields are lowercased with str.lower, as the filters compare them.
+    
+    >>> twv = {\
+    'a':{'name':'Anna', 'location':'', 'web':'', 'bio':'', 'following':[]},\
+    'b':{'name':'Hannah', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> text_index = build_text_index(twv)
+    >>> text_index['name']['lowered']['a']
+    'anna'
+    >>> sorted(text_index['name']['ngrams']['ann'])
+    ['a', 'b']
+    """
+    
+    text_index = {}
+    
+    for field in ['name', 'location']:
+        lowered = {}
+        ngrams = {}
+        for user in twv:
+            value = twv[user][field].lower()
+            lowered[user] = value
+            for i in range(len(value) - NGRAM_SIZE + 1):
+                ngram = value[i:i + NGRAM_SIZE]
+                if ngram not in ngrams:
+                    ngrams[ngram] = set()
+                ngrams[ngram].add(user)
+        text_index[field] = {'lowered': lowered, 'ngrams': ngrams}
+        
+    return text_index
+
+
+def search_text_index(field_index, value):
+    """(field index, str) -> set of str
+    
+    Return the set of usernames in field_index whose field includes str 
+    value, ignoring case. value must be at least NGRAM_SIZE characters long.
+    
+    >>> twv = {\
+    'a':{'name':'Anna', 'location':'', 'web':'', 'bio':'', 'following':[]},\
+    'b':{'name':'Hannah', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> sorted(search_text_index(build_text_index(twv)['name'], 'ANNA'))
+    ['a', 'b']
+    >>> sorted(search_text_index(build_text_index(twv)['name'], 'nnah'))
+    ['b']
+    """
+    
+    value = value.lower()
+    ngrams = field_index['ngrams']
+    postings = []
+    
+    for i in range(len(value) - NGRAM_SIZE + 1):
+        ngram = value[i:i + NGRAM_SIZE]
+        if ngram not in ngrams:
+            return set()
+        postings.append(ngrams[ngram])
+        
+    # Intersect the smallest sets first. Every n-gram of value matching does 
+    # not mean value itself matches, so the candidates are checked after.
+    
+    postings.sort(key=len)
+    candidates = set(postings[0])
+    for posting in postings[1:]:
+        candidates.intersection_update(posting)
+        
+    lowered = field_index['lowered']
+    return set(user for user in candidates if value in lowered[user])
+
+
+def all_followers(twv, username, follower_index=None):
+    """(Twitterverse dictionary, str, follower index) -> list of str
     
     Return list of str followers, which contains all users, in twitterverse 
-    twv, that are following str username.
+    twv, that are following str username. If follower_index is given, the 
+    followers are looked up in it (in sorted order) instead of scanning twv.
     
     >>> twv = {\
     'a':{'name':'A', 'location':'', 'web':'', 'bio':'',\
@@ -133,8 +525,14 @@ def all_followers(twv, username):
     '3':{'name':'Three', 'location':'', 'web':'', 'bio':'', 'following':[]}}
     >>> all_followers(twv, '1')
     []
+    >>> all_followers(twv, 'Obama', build_follower_index(twv))
+    ['1']
     """
     
+    if follower_index is not None:
+        return sorted(follower_index.get(username, []))
+    
+    _count('follower_scans')
     followers = []    
     
     for user in twv:
@@ -144,13 +542,15 @@ def all_followers(twv, username):
     return followers
 
 
-def get_search_results(twv, search_dict):
-    """(Twitterverse dictionary, search specification dictionary)
-        -> list of str
+@profiled('search', lambda args, result: len(result))
+def get_search_results(twv, search_dict, follower_index=None):
+    """(Twitterverse dictionary, search specification dictionary, 
+        follower index) -> list of str
     
     Perform the specified search on twitterverse twv, and return a list of str
     users that is all usernames in twitterverse twv that match the search 
-    criteria. There will not be duplicates in users.   
+    criteria. There will not be duplicates in users. If follower_index is 
+    given, it is used for the followers operation.
     
     >>> twv = {\
     'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':[]},\
@@ -183,53 +583,363 @@ def get_search_results(twv, search_dict):
     []
     """
     
-    users = [search_dict['username']]
+    # Each operation maps the set of users found so far (the frontier) to 
+    # the next one, so every user is expanded at most once per operation.
+    
+    frontier = None
+    previous_operation = None
+    unchanged = False
     
     for search_operation in search_dict['operations']:
-        if search_operation == 'following':
-            follows = []            
-            for user in users: 
-                if user in twv:
-                    follows.extend(twv[user]['following'])
-            users = remove_duplicates(follows)
+        if not is_search_operation(search_operation):
+            continue
+        if frontier is None:
+            frontier = set([search_dict['username']])
             
-        if search_operation == 'followers':
-            followers = []
-            for user in users:
-                followers.extend(all_followers(twv, user))
-            users = remove_duplicates(followers)
+        # Once an operation maps the frontier to itself, repeating it 
+        # changes nothing, and once the frontier is empty it stays empty.
+        if len(frontier) == 0:
+            break
+        if unchanged and search_operation == previous_operation:
+            continue
+        
+        next_frontier = expand_frontier(twv, frontier, search_operation, 
+                                        follower_index)
+        unchanged = next_frontier == frontier
+        previous_operation = search_operation
+        frontier = next_frontier
+        
+    if frontier is None:
+        return [search_dict['username']]
+    
+    return remove_duplicates(frontier)
+
+
+def is_search_operation(search_operation):
+    """(str) -> bool
+    
+    Return True iff search_operation is one of the search operations:
+    
+        - 'following': the users followed by a user found so far
+        - 'followers': the users following a user found so far
+        - 'following*N' or 'followers*N', for an int N > 0: the users 
+          reached from a user found so far in 1 to N steps of following or 
+          followers
+        - 'mutual': the users that a user found so far follows, and that 
+          follow that user back
+        - 'path-to USERNAME': the users on a shortest chain of following 
+          steps from a user found so far to USERNAME, or no users if there 
+          is none
+        
+    Other operations are ignored by get_search_results.
+    
+    >>> [is_search_operation(search_operation) for search_operation in\
+    ['followers', 'following*3', 'mutual', 'path-to a', 'following*0', 'x']]
+    [True, True, True, True, False, False]
+    """
+    
+    if search_operation in ('following', 'followers', 'mutual'):
+        return True
+    
+    direction, star, hops = search_operation.partition('*')
+    if star == '*':
+        return direction in ('following', 'followers') and \
+            hops.isdecimal() and int(hops) > 0
+    
+    words = search_operation.split()
+    return len(words) == 2 and words[0] == 'path-to'
+
+
+def expand_frontier(twv, frontier, search_operation, follower_index=None):
+    """(Twitterverse dictionary, set of str, str, follower index) -> set of str
+    
+    Return the set of users reached from the users in frontier by the 
+    search operation search_operation (see is_search_operation) in 
+    twitterverse twv. If follower_index is given, it is used to find 
+    followers.
+    
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['c']},\
+    'c':{'name':'C', 'location':'', 'web':'', 'bio':'', 'following':['a']}}
+    >>> sorted(expand_frontier(twv, {'a', 'b'}, 'following'))
+    ['b', 'c']
+    >>> sorted(expand_frontier(twv, {'a', 'b'}, 'followers'))
+    ['a', 'c']
+    >>> sorted(expand_frontier(twv, {'a'}, 'following*2'))
+    ['b', 'c']
+    """
+    
+    if search_operation == 'mutual':
+        return mutual_frontier(twv, frontier, follower_index)
+    
+    if '*' in search_operation:
+        direction, hops = search_operation.split('*')
+        return reach_within(twv, frontier, direction, int(hops), 
+                            follower_index)
+    
+    if search_operation.startswith('path-to'):
+        return set(shortest_path(twv, frontier, search_operation.split()[1], 
+                                 follower_index))
+    
+    next_frontier = set()
+    
+    if search_operation == 'following':
+        for user in frontier:
+            if user in twv:
+                next_frontier.update(twv[user]['following'])
+                
+    elif follower_index is not None:
+        for user in frontier:
+            next_frontier.update(follower_index.get(user, []))
             
-    return users
+    else:
+        # One pass over twv finds the followers of the whole frontier.
+        _count('follower_scans')
+        for user in twv:
+            if not frontier.isdisjoint(twv[user]['following']):
+                next_frontier.add(user)
+                
+    return next_frontier
+
+
+def reach_within(twv, frontier, direction, hops, follower_index=None):
+    """(Twitterverse dictionary, set of str, str, int, follower index) 
+        -> set of str
+    
+    Return the set of users reached from the users in frontier in 1 to hops 
+    steps of the search operation direction ('following' or 'followers') 
+    in twitterverse twv. Each user is expanded at most once.
+    
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['c']},\
+    'c':{'name':'C', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> sorted(reach_within(twv, {'c'}, 'followers', 5))
+    ['a', 'b']
+    """
+    
+    reached = set()
+    layer = frontier
+    
+    for hop in range(hops):
+        layer = expand_frontier(twv, layer, direction, follower_index)
+        layer.difference_update(reached)
+        if len(layer) == 0:
+            break
+        reached.update(layer)
+        
+    return reached
+
+
+def mutual_frontier(twv, frontier, follower_index=None):
+    """(Twitterverse dictionary, set of str, follower index) -> set of str
+    
+    Return the set of users that a user in frontier follows and that 
+    follow that user back, in twitterverse twv.
+    
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['a']},\
+    'c':{'name':'C', 'location':'', 'web':'', 'bio':'', 'following':['a']}}
+    >>> sorted(mutual_frontier(twv, {'a', 'c'}))
+    ['b']
+    """
+    
+    next_frontier = set()
+    
+    for user in frontier:
+        if user not in twv:
+            continue
+        followers = None
+        if follower_index is not None:
+            followers = follower_index.get(user, ())
+        for followed in twv[user]['following']:
+            if followers is not None:
+                follows_back = followed in followers
+            else:
+                follows_back = followed in twv and \
+                    user in twv[followed]['following']
+            if follows_back:
+                next_frontier.add(followed)
+                
+    return next_frontier
+
+
+def shortest_path(twv, sources, target, follower_index=None):
+    """(Twitterverse dictionary, iterable of str, str, follower index) 
+        -> list of str
+    
+    Return a shortest list of usernames that starts with a user in sources 
+    and ends with target, where each user follows the next one, in 
+    twitterverse twv; return [] if there is none. If there are several, 
+    the same one is always returned.
+    
+    The search is a breadth-first search from both ends at once, forward 
+    along following lists and backward along followers, always growing the 
+    smaller side, so it only visits about the users within half the path 
+    length of either end.
+    
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['c']},\
+    'c':{'name':'C', 'location':'', 'web':'', 'bio':'', 'following':['d']},\
+    'd':{'name':'D', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> shortest_path(twv, ['a'], 'd')
+    ['a', 'b', 'c', 'd']
+    >>> shortest_path(twv, ['d'], 'a')
+    []
+    """
+    
+    return bidirectional_path(
+        sources, target, lambda layer: _following_pairs(twv, layer), 
+        lambda layer: _follower_pairs(twv, layer, follower_index))
+
+
+def bidirectional_path(sources, target, following_pairs, follower_pairs):
+    """(iterable of str, str, function, function) -> list of str
+    
+    Return a shortest list of usernames from a user in sources to target, 
+    as shortest_path does, where following_pairs and follower_pairs take a 
+    sorted list of usernames and return an iterable of (user, followed) or 
+    (user, follower) pairs for them, in that order of users.
+    """
+    
+    sources = sorted(set(sources))
+    if target in sources:
+        return [target]
+    
+    # Each side maps the users it has reached to the user it reached them 
+    # from, and visits each layer in sorted order, so ties are broken the 
+    # same way every time.
+    
+    forward = dict.fromkeys(sources)
+    backward = {target: None}
+    forward_layer = sources
+    backward_layer = [target]
+    meeting = None
+    
+    while meeting is None and len(forward_layer) > 0 and \
+          len(backward_layer) > 0:
+        if len(forward_layer) <= len(backward_layer):
+            forward_layer, meeting = _path_step(
+                following_pairs(forward_layer), forward, backward)
+        else:
+            backward_layer, meeting = _path_step(
+                follower_pairs(backward_layer), backward, forward)
+            
+    if meeting is None:
+        return []
+    
+    path = []
+    user = meeting
+    while user is not None:
+        path.append(user)
+        user = forward[user]
+    path.reverse()
+    user = backward[meeting]
+    while user is not None:
+        path.append(user)
+        user = backward[user]
+    return path
+
+
+def _path_step(pairs, parents, other_parents):
+    """(iterable of (str, str), dict of {str: str}, dict of {str: str}) 
+        -> (list of str, str)
+    
+    Record in parents each user first reached by a (user, next user) pair 
+    in pairs, and return the sorted list of those users and None, or, as 
+    soon as one of them is in other_parents, that user instead of None.
+    """
+    
+    layer = []
+    
+    for user, next_user in pairs:
+        if next_user not in parents:
+            parents[next_user] = user
+            if next_user in other_parents:
+                return layer, next_user
+            layer.append(next_user)
+            
+    layer.sort()
+    return layer, None
+
+
+def _following_pairs(twv, layer):
+    """(Twitterverse dictionary, list of str) -> generator of (str, str)
+    
+    Yield a (user, followed) pair for each user in layer, in order, and each 
+    user it follows, in following list order.
+    """
+    
+    for user in layer:
+        if user in twv:
+            for followed in twv[user]['following']:
+                yield user, followed
+
+
+def _follower_pairs(twv, layer, follower_index=None):
+    """(Twitterverse dictionary, list of str, follower index) 
+        -> generator of (str, str)
+    
+    Yield a (user, follower) pair for each user in layer, in order, and 
+    each of its followers, in sorted order.
+    """
+    
+    if follower_index is None:
+        # One pass over twv finds the followers of the whole layer.
+        follower_index = {}
+        for user in layer:
+            follower_index[user] = set()
+        for follower in twv:
+            for followed in twv[follower]['following']:
+                if followed in follower_index:
+                    follower_index[followed].add(follower)
+                    
+    for user in layer:
+        for follower in sorted(follower_index.get(user, [])):
+            yield user, follower
 
 
 def remove_duplicates(users_list):
     """(list of str) -> list of str
     
-    Return list of str user_list with all duplicated items removed.
+    Return a new sorted list of str of the items in users_list, with all 
+    duplicated items removed. users_list is not modified.
     
     >>> remove_duplicates(['a', 'a', 'a', 'b', 'b', 'c', 'c', 'd'])
     ['a', 'b', 'c', 'd']
     
     >>> remove_duplicates([])
     []
+    
+    >>> users_list = ['c', 'a', 'c']
+    >>> remove_duplicates(users_list)
+    ['a', 'c']
+    >>> users_list
+    ['c', 'a', 'c']
     """
     
-    users_list.sort()
+    # Hashing drops the duplicates in one pass, so only the distinct users 
+    # are sorted.
     
-    for i in range(len(users_list)):
-        while i < (len(users_list) - 1) and users_list[i] == users_list[i + 1]:
-            users_list.pop(i + 1)
-            
-    return users_list
+    return sorted(set(users_list))
 
 
-def get_filter_results(twv, users, filter_dict):
-    """(Twitterverse dictionary, list of str, filter specification dictionary)
-        -> list of str
+@profiled('filter', lambda args, result: len(args[1]))
+def get_filter_results(twv, users, filter_dict, follower_index=None, 
+                       text_index=None):
+    """(Twitterverse dictionary, list of str, filter specification dictionary,
+        follower index, text index) -> list of str
 
     Perform the specified filter on users, and return a list of str 
     filtered_users that is all usernames in users that match the filter 
-    criteria. 
+    criteria. If follower_index is given, it is used for the following filter.
+    If text_index is given, it is used for the name-includes and 
+    location-includes filters. Raise KeyError if there is a name-includes or 
+    location-includes filter and a user in users has no record, or if users 
+    is not empty and the follower filter names a user with no record.
     
     >>> twv = {\
     'a':{'name':'A', 'location':'China', 'web':'', 'bio':'', 'following':[]},\
@@ -262,52 +972,138 @@ def get_filter_results(twv, users, filter_dict):
     ['b', 'd']
      """
     
+    # Each filter is compiled once, and each user is checked against the 
+    # cheapest filters first, stopping at the first one it fails.
+    
+    if len(users) == 0:
+        return []
+    
+    # Every record the filters need is looked up up front, so whether a 
+    # missing one raises KeyError does not depend on the order the filters 
+    # run in.
+    if 'name-includes' in filter_dict or 'location-includes' in filter_dict:
+        for user in users:
+            twv[user]
+    if 'follower' in filter_dict:
+        twv[filter_dict['follower']]
+    
+    predicates = compile_filters(twv, filter_dict, follower_index, text_index)
     rem_users = []
+    
     for user in users:
-        rem_users.append(user)
-        
-    # rem_users is equivalent to users but not stored in the same id space to
-    # not modify the list users        
+        for predicate in predicates:
+            if not predicate(user):
+                break
+        else:
+            rem_users.append(user)
+    
+    return rem_users
+
+
+def compile_filters(twv, filter_dict, follower_index=None, text_index=None):
+    """(Twitterverse dictionary, filter specification dictionary, 
+        follower index, text index) -> list of function
+    
+    Return a list of predicates, one per filter in filter_dict, each taking 
+    a username and returning True iff the user passes that filter. Filter 
+    values are lowercased and follower sets looked up once, here. The 
+    predicates are ordered cheapest first: set membership tests before 
+    substring tests. If follower_index is given, it is used for the 
+    following filter. If text_index is given, substring filters of at least 
+    NGRAM_SIZE characters become set membership tests on the users found in 
+    it, and shorter ones use its lowercased fields.
+    
+    >>> twv = {\
+    'a':{'name':'Apple', 'location':'', 'web':'', 'bio':'', 'following':[]},\
+    'b':{'name':'Banana', 'location':'', 'web':'', 'bio':'',\
+    'following':['a']}}
+    >>> predicates = compile_filters(twv, {'name-includes':'AN',\
+    'following':'a'})
+    >>> [predicate('b') for predicate in predicates]
+    [True, True]
+    >>> [predicate('a') for predicate in predicates]
+    [False, False]
+    """
+    
+    set_predicates = []
+    substring_predicates = []
     
     for filter_operation in filter_dict:
         
-        to_remove = []
-       
-        if filter_operation == 'name-includes':
-            for user in rem_users:
-                if filter_dict['name-includes'].lower()\
-                   not in twv[user]['name'].lower():
-                    to_remove.append(user)
+        if filter_operation in ('name-includes', 'location-includes') and \
+           text_index is not None:
+            field_index = text_index[filter_operation[0:-len('-includes')]]
+            value = filter_dict[filter_operation]
+            if len(value) >= NGRAM_SIZE:
+                set_predicates.append(_member_predicate(
+                    search_text_index(field_index, value)))
+            else:
+                substring_predicates.append(_lowered_predicate(
+                    field_index['lowered'], value))
         
+        elif filter_operation == 'name-includes':
+            substring_predicates.append(_includes_predicate(
+                twv, 'name', filter_dict['name-includes']))
+            
         elif filter_operation == 'location-includes':
-            for user in rem_users:
-                if filter_dict['location-includes'].lower()\
-                   not in twv[user]['location'].lower():
-                    to_remove.append(user)            
-        
+            substring_predicates.append(_includes_predicate(
+                twv, 'location', filter_dict['location-includes']))
+            
         elif filter_operation == 'follower':
-            for user in rem_users:
-                if user not in twv[filter_dict['follower']][
-                    'following']:
-                    to_remove.append(user)
+            set_predicates.append(_member_predicate(
+                set(twv[filter_dict['follower']]['following'])))
+            
+        elif follower_index is not None:
+            set_predicates.append(_member_predicate(
+                follower_index.get(filter_dict['following'], set())))
+            
         else:
-            for user in rem_users:
-                if user not in all_followers(twv,
-                                            filter_dict['following']):
-                    to_remove.append(user)
-        
-        for user in to_remove:
-            rem_users.remove(user)
+            set_predicates.append(_member_predicate(
+                set(all_followers(twv, filter_dict['following']))))
+            
+    return set_predicates + substring_predicates
+
+
+def _member_predicate(users):
+    """(set of str) -> function
     
-    return rem_users
+    Return a predicate that is True for exactly the usernames in users.
+    """
+    
+    return users.__contains__
+
+
+def _includes_predicate(twv, field, value):
+    """(Twitterverse dictionary, str, str) -> function
+    
+    Return a predicate that is True for a username iff str value is in the 
+    user's field in twv, ignoring case.
+    """
+    
+    value = value.lower()
     
+    return lambda user: value in twv[user][field].lower()
 
-def get_present_string(twv, users, present_dict):
+
+def _lowered_predicate(lowered, value):
+    """(dict of {str: str}, str) -> function
+    
+    Return a predicate that is True for a username iff str value is in the 
+    user's lowercased field in lowered, ignoring case.
+    """
+    
+    value = value.lower()
+    
+    return lambda user: value in lowered[user]
+    
+
+def get_present_string(twv, users, present_dict, follower_index=None):
     """(Twitterverse dictionary, list of str, 
-        presentation specification dictionary) -> str
+        presentation specification dictionary, follower index) -> str
         
     Format data in list of str users for presentation based on the given 
-    presentation specification and return the formatted string.
+    presentation specification and return the formatted string. If 
+    follower_index is given, it is used to sort by popularity.
     
     >>> twv = {\
     'Damon':{'name':'Damon', 'location':'China', 'web':'damon.com',\
@@ -356,44 +1152,115 @@ def get_present_string(twv, users, present_dict):
     "['Damon', 'Jaryd', 'Tina']"
     """
     
+    return ''.join(iter_present_chunks(twv, users, present_dict, 
+                                       follower_index))
+
+
+def write_present(twv, users, present_dict, output_file, follower_index=None):
+    """(Twitterverse dictionary, list of str, 
+        presentation specification dictionary, file open for writing, 
+        follower index) -> NoneType
+        
+    Write the string get_present_string would return to output_file, one 
+    user at a time, without building the whole string in memory.
+    
+    >>> import io
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> output_file = io.StringIO()
+    >>> write_present(twv, ['a'], {'sort-by': 'name', 'format': 'short'},\
+    output_file)
+    >>> output_file.getvalue()
+    "['a']"
+    """
+    
+    for chunk in iter_present_chunks(twv, users, present_dict, 
+                                     follower_index):
+        output_file.write(chunk)
+
+
+@_profiled_chunks('present')
+def iter_present_chunks(twv, users, present_dict, follower_index=None):
+    """(Twitterverse dictionary, list of str, 
+        presentation specification dictionary, follower index) 
+        -> generator of str
+        
+    Yield the string get_present_string would return in pieces, one per 
+    user in users plus the surrounding delimiters. users is sorted in place 
+    when the first piece is requested, unless present_dict has a limit 
+    smaller than len(users); then only the first limit users in sorted 
+    order are selected and presented, and users is not modified.
+    
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':[]},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['a']}}
+    >>> list(iter_present_chunks(twv, ['b', 'a'],\
+    {'sort-by': 'username', 'format': 'short'}))
+    ['[', "'a'", ', ', "'b'", ']']
+    >>> list(iter_present_chunks(twv, ['b', 'a'],\
+    {'sort-by': 'popularity', 'format': 'short', 'limit': '1'}))
+    ['[', "'a'", ']']
+    """
     
     if present_dict['sort-by'] == 'username':
-        tweet_sort(twv, users, username_first)
+        cmp = username_first
     
     elif present_dict['sort-by'] == 'name':
-        tweet_sort(twv, users, name_first)
+        cmp = name_first
     
     else:
-        tweet_sort(twv, users, more_popular)
-    
-    presentation = ''
+        cmp = more_popular
+        
+    if 'limit' in present_dict and int(present_dict['limit']) < len(users):
+        users = top_users(twv, users, cmp, int(present_dict['limit']), 
+                          follower_index)
+    else:
+        tweet_sort(twv, users, cmp, follower_index)
     
     if present_dict['format'] == 'long':
         
+        # Look every user up before the first piece is yielded, so that a 
+        # missing user raises KeyError before any output is written.
+        for user in users:
+            if user not in twv:
+                raise KeyError(user)
+        
         if len(users) == 0:
-            return '----------\n----------\n'
+            yield '----------\n----------\n'
         
         else:
             for user in users:
-                presentation += ('----------\n{0}\nname: {1}\nlocation: {2}' +\
+                yield ('----------\n{0}\nname: {1}\nlocation: {2}' +\
                     '\nwebsite: {3}\nbio:\n{4}\nfollowing: {5}\n').format(user,
                                         twv[user]['name'], 
                                         twv[user]['location'], 
                                         twv[user]['web'], 
                                         twv[user]['bio'], 
                                         twv[user]['following'])
-        return presentation + '----------\n'
+            yield '----------\n'
     
     else:
-        return str(users)    
+        # Same as str(users), since the repr of a list of str is the repr 
+        # of each str separated by ', '.
+        yield '['
+        for i in range(len(users)):
+            if i > 0:
+                yield ', '
+            yield repr(users[i])
+        yield ']'
     
 
 # --- Sorting Helper Functions ---
-def tweet_sort(twitter_data, results, cmp):
-    """ (Twitterverse dictionary, list of str, function) -> NoneType
+@profiled('sort', lambda args, result: len(args[1]))
+def tweet_sort(twitter_data, results, cmp, follower_index=None):
+    """ (Twitterverse dictionary, list of str, function, follower index) 
+        -> NoneType
     
     Sort the results list using the comparison function cmp and the data in 
-    twitter_data.
+    twitter_data. The sort is stable, and for the comparison functions in 
+    this module a sort key is computed once per user instead of calling cmp 
+    on every comparison. If follower_index is given, it is used to count 
+    followers for more_popular.
     
     >>> twitter_data = {\
     'a':{'name':'Zed', 'location':'', 'web':'', 'bio':'', 'following':[]}, \
@@ -408,21 +1275,151 @@ def tweet_sort(twitter_data, results, cmp):
     ['b', 'a', 'c']
     """
     
-    # Insertion sort
-    for i in range(1, len(results)):
-        current = results[i]
-        position = i
-        while position > 0 and cmp(twitter_data, results[position - 1], current) > 0:
-            results[position] = results[position - 1]
-            position = position - 1 
-        results[position] = current  
+    # A single result is already sorted, and cmp is never called on it.
+    if len(results) < 2:
+        return
+    
+    if cmp in SORT_KEYS:
+        _count('sort_keys', len(results))
+        results.sort(key=SORT_KEYS[cmp](twitter_data, follower_index))
+    else:
+        results.sort(key=cmp_to_key(_comparison(twitter_data, cmp)))
+
+
+@profiled('sort', lambda args, result: len(args[1]))
+def top_users(twitter_data, results, cmp, k, follower_index=None):
+    """ (Twitterverse dictionary, list of str, function, int, follower index)
+        -> list of str
+    
+    Return the first k users of results in the order tweet_sort would sort 
+    them in with the comparison function cmp, without sorting all of 
+    results. results is not modified.
+    
+    >>> twitter_data = {\
+    'a':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':['b']}, \
+    'b':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':[]}, \
+    'c':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':['b']}}
+    >>> top_users(twitter_data, ['c', 'a', 'b'], more_popular, 2)
+    ['b', 'a']
+    """
+    
+    if k <= 0:
+        return []
+    
+    # A heap of k users is kept while scanning results, so this takes 
+    # O(n log k) time; ties keep their order in results, as in tweet_sort.
+    
+    if cmp in SORT_KEYS:
+        _count('sort_keys', len(results))
+        key = SORT_KEYS[cmp](twitter_data, follower_index)
+    else:
+        key = cmp_to_key(_comparison(twitter_data, cmp))
+        
+    return heapq.nsmallest(k, results, key=key)
+
+
+def _comparison(twitter_data, cmp):
+    """ (Twitterverse dictionary, function) -> function
+    
+    Return a function comparing two usernames by the comparison function 
+    cmp on twitter_data, which counts its calls in the profiler of this 
+    thread, if there is one.
+    """
+    
+    profiler = get_profiler()
+    if profiler is None:
+        return lambda a, b: cmp(twitter_data, a, b)
+    
+    def compare(a, b):
+        profiler.count('comparisons', 1)
+        return cmp(twitter_data, a, b)
+    
+    return compare
+
+
+def follower_counts(twitter_data):
+    """ (Twitterverse dictionary) -> dict of {str: int}
+    
+    Return a dict mapping each username followed by at least one user in 
+    twitter_data to the number of distinct users following it.
+    
+    >>> twitter_data = {\
+    'a':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':['b']}, \
+    'b':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':[]}, \
+    'c':{'name':'', 'location':'', 'web':'', 'bio':'', \
+    'following':['b', 'b']}}
+    >>> follower_counts(twitter_data)
+    {'b': 2}
+    """
+    
+    _count('follower_scans')
+    counts = {}
+    
+    for user in twitter_data:
+        for followed in set(twitter_data[user]['following']):
+            counts[followed] = counts.get(followed, 0) + 1
+            
+    return counts
+
+
+def more_popular_key(twitter_data, follower_index=None):
+    """ (Twitterverse dictionary, follower index) -> function
+    
+    Return a sort key function that orders usernames the same way as 
+    more_popular.
+    
+    >>> twitter_data = {\
+    'a':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':['b']}, \
+    'b':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':[]}, \
+    'c':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> sorted(['c', 'a', 'b'], key=more_popular_key(twitter_data))
+    ['b', 'a', 'c']
+    """
+    
+    if follower_index is not None:
+        return lambda user: (-len(follower_index.get(user, [])), user)
+    
+    counts = follower_counts(twitter_data)
+    return lambda user: (-counts.get(user, 0), user)
+
+
+def username_first_key(twitter_data, follower_index=None):
+    """ (Twitterverse dictionary, follower index) -> function
+    
+    Return a sort key function that orders usernames the same way as 
+    username_first.
+    
+    >>> sorted(['c', 'a', 'b'], key=username_first_key({}))
+    ['a', 'b', 'c']
+    """
+    
+    return lambda user: user
+
+
+def name_first_key(twitter_data, follower_index=None):
+    """ (Twitterverse dictionary, follower index) -> function
+    
+    Return a sort key function that orders usernames the same way as 
+    name_first.
+    
+    >>> twitter_data = {\
+    'a':{'name':'Lee', 'location':'', 'web':'', 'bio':'', 'following':[]}, \
+    'b':{'name':'Lee', 'location':'', 'web':'', 'bio':'', 'following':[]}, \
+    'c':{'name':'Ann', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> sorted(['b', 'a', 'c'], key=name_first_key(twitter_data))
+    ['c', 'a', 'b']
+    """
+    
+    return lambda user: (twitter_data[user]['name'], user)
+
             
-def more_popular(twitter_data, a, b):
-    """ (Twitterverse dictionary, str, str) -> int
+def more_popular(twitter_data, a, b, follower_index=None):
+    """ (Twitterverse dictionary, str, str, follower index) -> int
     
     Return -1 if user a has more followers than user b, 1 if fewer followers, 
     and the result of sorting by username if they have the same, based on the 
-    data in twitter_data.
+    data in twitter_data. If follower_index is given, followers are counted 
+    from it instead of scanning twitter_data.
     
     >>> twitter_data = {\
     'a':{'name':'', 'location':'', 'web':'', 'bio':'', 'following':['b']}, \
@@ -432,10 +1429,16 @@ def more_popular(twitter_data, a, b):
     1
     >>> more_popular(twitter_data, 'a', 'c')
     -1
+    >>> more_popular(twitter_data, 'b', 'c', build_follower_index(twitter_data))
+    -1
     """
     
-    a_popularity = len(all_followers(twitter_data, a)) 
-    b_popularity = len(all_followers(twitter_data, b))
+    if follower_index is not None:
+        a_popularity = len(follower_index.get(a, []))
+        b_popularity = len(follower_index.get(b, []))
+    else:
+        a_popularity = len(all_followers(twitter_data, a)) 
+        b_popularity = len(all_followers(twitter_data, b))
     if a_popularity > b_popularity:
         return -1
     if a_popularity < b_popularity:
@@ -491,6 +1494,12 @@ def name_first(twitter_data, a, b):
     return username_first(twitter_data, a, b)       
 
 
+# Sort key builders for the comparison functions above, used by tweet_sort.
+SORT_KEYS = {more_popular: more_popular_key, 
+             username_first: username_first_key, 
+             name_first: name_first_key}
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -0,0 +1,556 @@
+"""
+Compiled graph representation of a Twitterverse.
+
+A TwitterverseGraph stores the same information as a Twitterverse dictionary,
+but interns every username to an int user ID and keeps the following edges
+in compressed sparse row (CSR) form:
+
+    - following_offsets[i] to following_offsets[i + 1] is the slice of
+      following_targets holding the IDs user i is following, in data file
+      order (duplicates kept, as in the "following" list)
+    - follower_offsets[i] to follower_offsets[i + 1] is the slice of
+      follower_sources holding the IDs of the distinct users following user i
+
+Both are array('i') buffers, so an edge costs 4 bytes in each direction
+instead of a str reference in a list. Users that are followed but have no
+record in the data file get an ID too, but no profile.
+
+get_search_results, get_filter_results and get_present_string in this module
+take a TwitterverseGraph in place of a Twitterverse dictionary and return the
+same results as the functions of the same name in twitterverse_functions.
+"""
+
+from array import array
+
+import twitterverse_bitmap as tb
+import twitterverse_functions as tf
+
+
+class TwitterverseGraph:
+    """A Twitterverse with int user IDs and array-backed adjacency."""
+
+    def __init__(self):
+        """(TwitterverseGraph) -> NoneType
+
+        Initialize an empty graph.
+        """
+
+        self.usernames = []
+        self.ids = {}
+        self.has_record = bytearray()
+        self.names = []
+        self.locations = []
+        self.webs = []
+        self.bios = []
+        self.following_offsets = array('i', [0])
+        self.following_targets = array('i')
+        self.follower_offsets = array('i', [0])
+        self.follower_sources = array('i')
+
+    def __len__(self):
+        """(TwitterverseGraph) -> int
+
+        Return the number of user IDs in this graph.
+        """
+
+        return len(self.usernames)
+
+    def __contains__(self, username):
+        """(TwitterverseGraph, str) -> bool
+
+        Return True iff username has a record in this graph, like
+        username in twv for a Twitterverse dictionary.
+        """
+
+        user_id = self.ids.get(username)
+        return user_id is not None and self.has_record[user_id] == 1
+
+    def intern(self, username):
+        """(TwitterverseGraph, str) -> int
+
+        Return the user ID of username, assigning a new one if needed.
+        """
+
+        user_id = self.ids.get(username)
+        if user_id is None:
+            user_id = len(self.usernames)
+            self.ids[username] = user_id
+            self.usernames.append(username)
+            self.has_record.append(0)
+            self.names.append('')
+            self.locations.append('')
+            self.webs.append('')
+            self.bios.append('')
+        return user_id
+
+    def following(self, user_id):
+        """(TwitterverseGraph, int) -> array of int
+
+        Return the IDs of the users that user_id is following.
+        """
+
+        return self.following_targets[self.following_offsets[user_id]:
+                                      self.following_offsets[user_id + 1]]
+
+    def followers(self, user_id):
+        """(TwitterverseGraph, int) -> array of int
+
+        Return the IDs of the distinct users following user_id.
+        """
+
+        return self.follower_sources[self.follower_offsets[user_id]:
+                                     self.follower_offsets[user_id + 1]]
+
+    def follower_count(self, user_id):
+        """(TwitterverseGraph, int) -> int
+
+        Return the number of distinct users following user_id.
+        """
+
+        return (self.follower_offsets[user_id + 1] -
+                self.follower_offsets[user_id])
+
+    def profile(self, username):
+        """(TwitterverseGraph, str) -> int
+
+        Return the user ID of username. Raise KeyError if username has no
+        record, as indexing a Twitterverse dictionary would.
+        """
+
+        if username not in self:
+            raise KeyError(username)
+        return self.ids[username]
+
+    def user_dict(self, username):
+        """(TwitterverseGraph, str) -> dict of {str: object}
+
+        Return the user dictionary of username, as stored in a Twitterverse
+        dictionary. Raise KeyError if username has no record.
+        """
+
+        user_id = self.profile(username)
+        return {'name': self.names[user_id],
+                'location': self.locations[user_id],
+                'web': self.webs[user_id], 'bio': self.bios[user_id],
+                'following': [self.usernames[followed] for followed in
+                              self.following(user_id)]}
+
+
+def build_graph(records):
+    """(iterable of (str, str, str, str, str, list of str)) -> TwitterverseGraph
+
+    Return a TwitterverseGraph built from records, each a tuple of
+    (username, name, location, web, bio, following) in data file order. A
+    later record of the same username replaces the earlier one, as in
+    process_data.
+
+    >>> graph = build_graph([('a', 'A', '', '', '', ['b', 'c', 'b']),\
+    ('b', 'B', '', '', '', ['a'])])
+    >>> graph.usernames
+    ['a', 'b', 'c']
+    >>> list(graph.following(0))
+    [1, 2, 1]
+    >>> list(graph.followers(1))
+    [0]
+    >>> 'c' in graph
+    False
+    >>> graph = build_graph([('a', 'A', '', '', '', ['c']),\
+    ('b', 'B', '', '', '', ['c']), ('a', 'A2', '', '', '', ['c'])])
+    >>> graph.names[0], list(graph.following(0)), list(graph.followers(1))
+    ('A2', [1], [2, 0])
+    """
+
+    graph = TwitterverseGraph()
+    sources = array('i')
+    targets = array('i')
+    replaced = {}
+
+    for username, name, location, web, bio, following in records:
+        user_id = graph.intern(username)
+        if graph.has_record[user_id] == 1:
+            replaced[user_id] = len(sources)
+        graph.has_record[user_id] = 1
+        graph.names[user_id] = name
+        graph.locations[user_id] = location
+        graph.webs[user_id] = web
+        graph.bios[user_id] = bio
+        for followed in following:
+            sources.append(user_id)
+            targets.append(graph.intern(followed))
+
+    set_edges(graph, sources, targets, replaced)
+    return graph
+
+
+def set_edges(graph, sources, targets, replaced=None):
+    """(TwitterverseGraph, array of int, array of int, dict of {int: int})
+        -> NoneType
+
+    Set the edge arrays of graph to the edges from sources[i] to targets[i],
+    for each index i, given in data file order. If replaced is given, it
+    maps each user ID with more than one record to the index of the first
+    edge of its last record, and its edges before that index are dropped.
+
+    >>> graph = TwitterverseGraph()
+    >>> graph.intern('a'), graph.intern('b')
+    (0, 1)
+    >>> set_edges(graph, array('i', [0, 0]), array('i', [1, 1]))
+    >>> list(graph.following(0)), list(graph.followers(1))
+    ([1, 1], [0])
+    >>> set_edges(graph, array('i', [0, 1, 0]), array('i', [1, 0, 0]),\
+    {0: 2})
+    >>> list(graph.following(0)), list(graph.followers(0))
+    ([0], [1, 0])
+    """
+
+    if replaced:
+        kept = [i for i in range(len(sources))
+                if i >= replaced.get(sources[i], 0)]
+        sources = array('i', [sources[i] for i in kept])
+        targets = array('i', [targets[i] for i in kept])
+
+    graph.following_offsets, graph.following_targets = \
+        _compress(len(graph), sources, targets, False)
+    graph.follower_offsets, graph.follower_sources = \
+        _compress(len(graph), targets, sources, True)
+
+
+def _compress(size, keys, values, distinct):
+    """(int, array of int, array of int, bool) -> (array of int, array of int)
+
+    Return the CSR (offsets, values) arrays grouping values by keys, keeping
+    the edge order within each group. If distinct is True, repeated values
+    within a group are dropped.
+    """
+
+    counts = array('i', bytes(4 * (size + 1)))
+    for key in keys:
+        counts[key + 1] += 1
+    for i in range(size):
+        counts[i + 1] += counts[i]
+
+    grouped = array('i', bytes(4 * len(values)))
+    position = array('i', counts)
+    for key, value in zip(keys, values):
+        grouped[position[key]] = value
+        position[key] += 1
+
+    if not distinct:
+        return counts, grouped
+
+    # Edges are in data file order, and each user's edges come from its one
+    # record, so repeats of the same follower in one group are adjacent and
+    # only the group's last value needs checking.
+    offsets = array('i', [0])
+    unique = array('i')
+    for key in range(size):
+        start = len(unique)
+        for i in range(counts[key], counts[key + 1]):
+            if len(unique) == start or unique[-1] != grouped[i]:
+                unique.append(grouped[i])
+        offsets.append(len(unique))
+    return offsets, unique
+
+
+def process_graph(data_file):
+    """(file open for reading) -> TwitterverseGraph
+
+    Read data_file, in the same format as process_data, and return the
+    TwitterverseGraph it describes without building a Twitterverse dictionary.
+    """
+
+    return build_graph((username, user['name'], user['location'], user['web'],
+                        user['bio'], user['following'])
+                       for username, user in tf.iter_users(data_file))
+
+
+def graph_from_twv(twv):
+    """(Twitterverse dictionary) -> TwitterverseGraph
+
+    Return the TwitterverseGraph of twitterverse twv.
+
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> graph = graph_from_twv(twv)
+    >>> graph.follower_count(graph.ids['b'])
+    1
+    """
+
+    return build_graph((username, twv[username]['name'],
+                        twv[username]['location'], twv[username]['web'],
+                        twv[username]['bio'], twv[username]['following'])
+                       for username in twv)
+
+
+def get_search_results(graph, search_dict):
+    """(TwitterverseGraph, search specification dictionary) -> list of str
+
+    Perform the specified search on graph, and return the sorted list of
+    usernames that match the search criteria, as
+    twitterverse_functions.get_search_results does on a Twitterverse
+    dictionary.
+
+    >>> graph = build_graph([('a', 'A', '', '', '', []),\
+    ('b', 'B', '', '', '', ['a']), ('c', 'C', '', '', '', ['a', 'b'])])
+    >>> get_search_results(graph, {'username': 'c',\
+    'operations': ['following', 'followers']})
+    ['b', 'c']
+    """
+
+    username = search_dict['username']
+    operations = [search_operation for search_operation in
+                  search_dict['operations']
+                  if tf.is_search_operation(search_operation)]
+    if len(operations) == 0:
+        return [username]
+
+    # A username with no ID has no edges, so once it is reached it can only
+    # stay in the results as the whole of a path to itself.
+    user_ids = set()
+    unknown = set()
+    if username in graph.ids:
+        user_ids.add(graph.ids[username])
+    else:
+        unknown.add(username)
+
+    for search_operation in operations:
+        if len(unknown) > 0 and search_operation.startswith('path-to'):
+            path = shortest_path(graph, [graph.usernames[user_id]
+                                         for user_id in user_ids] +
+                                 list(unknown), search_operation.split()[1])
+            user_ids = set(graph.ids[user] for user in path
+                           if user in graph.ids)
+            unknown = set(user for user in path if user not in graph.ids)
+        else:
+            user_ids = expand_ids(graph, user_ids, search_operation)
+            unknown = set()
+
+    return sorted([graph.usernames[user_id] for user_id in user_ids] +
+                  list(unknown))
+
+
+def expand_ids(graph, user_ids, search_operation):
+    """(TwitterverseGraph, set of int, str) -> set of int
+
+    Return the set of IDs of users reached from the users in user_ids by
+    the search operation search_operation (see
+    twitterverse_functions.is_search_operation) in graph.
+
+    >>> graph = build_graph([('a', 'A', '', '', '', ['b']),\
+    ('b', 'B', '', '', '', ['a', 'c']), ('c', 'C', '', '', '', [])])
+    >>> sorted(expand_ids(graph, {0}, 'mutual'))
+    [1]
+    >>> sorted(expand_ids(graph, {2}, 'followers*2'))
+    [0, 1]
+    >>> sorted(expand_ids(graph, {0}, 'path-to c'))
+    [0, 1, 2]
+    """
+
+    next_ids = set()
+
+    if search_operation == 'following':
+        for user_id in user_ids:
+            if graph.has_record[user_id]:
+                next_ids.update(graph.following(user_id))
+
+    elif search_operation == 'followers':
+        for user_id in user_ids:
+            next_ids.update(graph.followers(user_id))
+
+    elif search_operation == 'mutual':
+        for user_id in user_ids:
+            if graph.has_record[user_id]:
+                followers = set(graph.followers(user_id))
+                next_ids.update(followed for followed in
+                                graph.following(user_id)
+                                if followed in followers)
+
+    elif '*' in search_operation:
+        direction, hops = search_operation.split('*')
+        layer = user_ids
+        for hop in range(int(hops)):
+            layer = expand_ids(graph, layer, direction)
+            layer.difference_update(next_ids)
+            if len(layer) == 0:
+                break
+            next_ids.update(layer)
+
+    else:
+        path = shortest_path(graph, [graph.usernames[user_id]
+                                     for user_id in user_ids],
+                             search_operation.split()[1])
+        next_ids.update(graph.ids[user] for user in path
+                        if user in graph.ids)
+
+    return next_ids
+
+
+def shortest_path(graph, sources, target):
+    """(TwitterverseGraph, iterable of str, str) -> list of str
+
+    Return the same shortest list of usernames from a user in sources to
+    target as twitterverse_functions.shortest_path does on a Twitterverse
+    dictionary.
+
+    >>> graph = build_graph([('a', 'A', '', '', '', ['b']),\
+    ('b', 'B', '', '', '', ['c'])])
+    >>> shortest_path(graph, ['a'], 'c')
+    ['a', 'b', 'c']
+    """
+
+    usernames = graph.usernames
+
+    def following_pairs(layer):
+        for user in layer:
+            if user in graph:
+                for followed in graph.following(graph.ids[user]):
+                    yield user, usernames[followed]
+
+    def follower_pairs(layer):
+        for user in layer:
+            if user in graph.ids:
+                for follower in sorted(usernames[follower] for follower in
+                                       graph.followers(graph.ids[user])):
+                    yield user, follower
+
+    return tf.bidirectional_path(sources, target, following_pairs,
+                                 follower_pairs)
+
+
+def get_filter_results(graph, users, filter_dict):
+    """(TwitterverseGraph, list of str, filter specification dictionary)
+        -> list of str
+
+    Perform the specified filter on users, and return the list of usernames
+    in users that match the filter criteria, as
+    twitterverse_functions.get_filter_results does on a Twitterverse
+    dictionary.
+
+    >>> graph = build_graph([('a', 'Apple', '', '', '', []),\
+    ('b', 'Banana', '', '', '', ['a']),\
+    ('c', 'Cherry', '', '', '', ['a', 'b'])])
+    >>> get_filter_results(graph, ['a', 'b', 'c'],\
+    {'name-includes': 'A', 'following': 'a'})
+    ['b']
+    """
+
+    if len(users) == 0:
+        return []
+
+    # As there, every record the filters need is looked up up front.
+    if 'name-includes' in filter_dict or 'location-includes' in filter_dict:
+        for user in users:
+            graph.profile(user)
+    if 'follower' in filter_dict:
+        graph.profile(filter_dict['follower'])
+
+    rem_users = list(users)
+
+    for filter_operation in filter_dict:
+
+        if filter_operation == 'name-includes':
+            value = filter_dict['name-includes'].lower()
+            rem_users = [user for user in rem_users
+                         if value in graph.names[graph.profile(user)].lower()]
+
+        elif filter_operation == 'location-includes':
+            value = filter_dict['location-includes'].lower()
+            rem_users = [user for user in rem_users if value in
+                         graph.locations[graph.profile(user)].lower()]
+
+    # The follower and following filters are both tests of user IDs, so
+    # they are combined into one test of the intersection of their IDs.
+    id_lists = []
+    if 'follower' in filter_dict:
+        id_lists.append(graph.following(
+            graph.profile(filter_dict['follower'])))
+    if 'following' in filter_dict:
+        if filter_dict['following'] in graph.ids:
+            id_lists.append(graph.followers(
+                graph.ids[filter_dict['following']]))
+        else:
+            id_lists.append([])
+    if len(id_lists) > 0 and len(rem_users) > 0:
+        is_member = _id_test(graph, id_lists)
+        rem_users = [user for user in rem_users
+                     if is_member(graph.ids.get(user, -1))]
+
+    return rem_users
+
+
+# The fraction of a graph's user IDs at or above which a set of them is
+# held as a bitmap, which then takes less memory than a set would.
+BITMAP_FRACTION = 1 / 64
+
+
+def _id_test(graph, id_lists):
+    """(TwitterverseGraph, list of array of int) -> function
+
+    Return a function that takes a user ID, or -1 for none, and returns True
+    iff it is in every one of id_lists. The lists are intersected as bitmaps
+    only if each holds at least BITMAP_FRACTION of the IDs in graph, since a
+    bitmap takes time and memory in proportion to the number of IDs in
+    graph; otherwise they are intersected as a set, starting from the
+    shortest.
+    """
+
+    threshold = max(len(graph) * BITMAP_FRACTION, 1)
+    if all(len(user_ids) >= threshold for user_ids in id_lists):
+        bitmap = tb.from_ids(id_lists[0])
+        for user_ids in id_lists[1:]:
+            bitmap &= tb.from_ids(user_ids)
+        bitmap_test = tb.member_test(bitmap)
+        return lambda user_id: user_id >= 0 and bitmap_test(user_id)
+
+    id_lists = sorted(id_lists, key=len)
+    id_set = set(id_lists[0])
+    for user_ids in id_lists[1:]:
+        id_set.intersection_update(user_ids)
+    return id_set.__contains__
+
+
+def get_present_string(graph, users, present_dict):
+    """(TwitterverseGraph, list of str, presentation specification dictionary)
+        -> str
+
+    Format data in list of str users for presentation based on the given
+    presentation specification and return the formatted string, as
+    twitterverse_functions.get_present_string does on a Twitterverse
+    dictionary. Only the records of users are looked up in graph.
+
+    >>> graph = build_graph([('a', 'A', '', '', '', []),\
+    ('b', 'B', '', '', '', ['a'])])
+    >>> get_present_string(graph, ['b', 'a'],\
+    {'sort-by': 'popularity', 'format': 'short'})
+    "['a', 'b']"
+    """
+
+    return ''.join(iter_present_chunks(graph, users, present_dict))
+
+
+def iter_present_chunks(graph, users, present_dict):
+    """(TwitterverseGraph, list of str, presentation specification dictionary)
+        -> generator of str
+
+    Yield the string get_present_string would return in pieces, as
+    twitterverse_functions.iter_present_chunks does on a Twitterverse
+    dictionary.
+    """
+
+    twv = {}
+    follower_index = {}
+    for user in users:
+        if user in graph:
+            twv[user] = graph.user_dict(user)
+        if user in graph.ids:
+            # Only the number of followers is used for sorting, so the
+            # follower IDs stand in for the set of follower usernames.
+            follower_index[user] = graph.followers(graph.ids[user])
+
+    return tf.iter_present_chunks(twv, users, present_dict, follower_index)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,348 @@
+"""
+Loading a Twitterverse dictionary whose webs and bios are read on demand.
+
+process_data maps a text data file into memory and returns the same
+Twitterverse dictionary as twitterverse_functions.process_data, except that
+each user dictionary is a LazyUser: its name, location and following are
+decoded up front, but its web and bio are only decoded from the mapped file
+the first time they are looked up. The data file must not change while the
+users are in use.
+
+A LazyUser stores its web and bio in itself when they are first read, so
+each LazySource has a lock that such reads take, and LazyUsers can be read
+from several threads at once.
+"""
+
+import codecs
+import io
+import mmap
+import threading
+
+import twitterverse_functions as tf
+
+# Encodings in which each line of a data file can be found byte by byte.
+LAZY_ENCODINGS = ('utf-8', 'ascii', 'iso8859-1', 'cp1252')
+
+
+@tf.profiled('parse', lambda args, result: len(result[0])
+             if isinstance(result, tuple) else len(result))
+def process_data(data_file, build_index=False):
+    """(file open for reading, bool) -> Twitterverse dictionary
+
+    Read data_file and return twv in Twitterverse dictionary format, with
+    its users read by iter_lazy_users. If build_index is True, return a
+    tuple (twv, follower index) instead, as
+    twitterverse_functions.process_data does.
+    """
+
+    twv = {}
+
+    for username, twv_sub in iter_lazy_users(data_file):
+        twv[username] = twv_sub
+
+    if build_index:
+        return twv, tf.build_follower_index(twv)
+
+    return twv
+
+
+def iter_lazy_users(data_file):
+    """(file open for reading) -> generator of (str, LazyUser)
+
+    Yield the same (username, user dictionary) tuples as
+    twitterverse_functions.iter_users, except that each user dictionary is a
+    LazyUser holding only the file offsets of the web and bio, which are
+    read when first looked up. The whole of data_file is mapped into
+    memory, wherever it has been read up to.
+
+    Records not in the usual layout (a bio line or following line of
+    'END', or '\\r' line endings) and every record after them are read as
+    iter_users reads them. If data_file is not a file on disk, or not in an
+    encoding in LAZY_ENCODINGS, all of it is.
+
+    >>> import tempfile
+    >>> data_file = tempfile.NamedTemporaryFile('w+')
+    >>> print('a\\nA\\nTO\\nweb\\nHi\\nENDBIO\\nb\\nEND', file=data_file,\
+    flush=True)
+    >>> data_file.seek(0)
+    0
+    >>> for username, user in iter_lazy_users(data_file):
+    ...     print(username, user['name'], sorted(dict.keys(user)), user['bio'])
+    a A ['following', 'location', 'name'] Hi
+    >>> data_file.close()
+    """
+
+    try:
+        encoding = codecs.lookup(data_file.encoding).name
+        file_number = data_file.fileno()
+    except (AttributeError, TypeError, OSError, ValueError):
+        encoding = None
+    if encoding not in LAZY_ENCODINGS:
+        yield from tf.iter_users(data_file)
+        return
+
+    try:
+        buffer = mmap.mmap(file_number, 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # An empty file cannot be mapped, and holds no users.
+        return
+
+    source = LazySource(buffer, encoding)
+    position = 0
+
+    # Records are split off about CHUNK_SIZE bytes at a time, in bulk.
+
+    while True:
+        chunk_end = buffer.rfind(b'\nEND\n', position,
+                                 position + tf.CHUNK_SIZE)
+        if chunk_end == -1:
+            chunk_end = buffer.find(b'\nEND\n', position)
+        if chunk_end == -1:
+            break
+
+        pieces = buffer[position:chunk_end + len(b'\nEND\n')].split(
+            b'\nEND\n')
+        for piece in pieces[0:-1]:
+            parsed = None
+            if b'\r' not in piece:
+                parsed = _parse_lazy_piece(piece, position, source)
+            if parsed is None:
+                break
+            if parsed[0] == '':
+                return
+            yield parsed
+            position += len(piece) + len(b'\nEND\n')
+        else:
+            continue
+        break
+
+    yield from tf.iter_users(io.TextIOWrapper(io.BytesIO(buffer[position:]),
+                                              encoding))
+
+
+def _parse_lazy_piece(piece, piece_start, source):
+    """(bytes, int, LazySource) -> (str, LazyUser) or NoneType
+
+    Return the (username, user dictionary) tuple of the user record in
+    piece, as twitterverse_functions._parse_piece does, where piece starts
+    at offset piece_start of source. The username is '' if there are no
+    more users. Return None if piece is not laid out as a single record.
+    """
+
+    head, endbio, following = piece.partition(b'\nENDBIO')
+    fields = head.split(b'\n', 4)
+
+    username = fields[0].decode(source.encoding).strip()
+
+    if username == '':
+        return '', None
+    if endbio == b'' or len(fields) < 4 or following[0:1] not in (b'', b'\n'):
+        return None
+
+    following = following.decode(source.encoding).split('\n')
+    following = [line.strip() for line in following[1:]]
+    if 'END' in following:
+        return None
+
+    twv_sub = LazyUser(name=fields[1].decode(source.encoding).strip(),
+                       location=fields[2].decode(source.encoding).strip(),
+                       following=following)
+    twv_sub.source = source
+    twv_sub.offset = piece_start
+
+    return username, twv_sub
+
+
+class LazySource:
+    """A data file mapped into memory, for LazyUser fields to be read from."""
+
+    def __init__(self, buffer, encoding):
+        """(LazySource, mmap, str) -> NoneType
+
+        Initialize a source reading buffer, which is in encoding encoding.
+        """
+
+        self.buffer = buffer
+        self.encoding = encoding
+        self.lock = threading.Lock()
+
+    def read_profile(self, offset):
+        """(LazySource, int) -> (str, str)
+
+        Return the web and bio of the user record starting at byte offset
+        offset of this source.
+        """
+
+        head = self.buffer[offset:self.buffer.find(b'\nENDBIO', offset)]
+        fields = head.split(b'\n', 4)
+
+        if len(fields) < 5:
+            return fields[3].decode(self.encoding).strip(), ''
+        return (fields[3].decode(self.encoding).strip(),
+                fields[4].decode(self.encoding))
+
+
+class LazyUser(dict):
+    """A user dictionary whose web and bio are read from a LazySource the
+    first time they are looked up. Until then, only looking them up, get,
+    in and the methods going over every field see them."""
+
+    __slots__ = ('source', 'offset')
+
+    def __missing__(self, key):
+        """(LazyUser, str) -> str
+
+        Read this user's web and bio from its source and store them, unless
+        they were set already, if key is 'web' or 'bio', and return the
+        value of key. Raise KeyError for any other key.
+        """
+
+        # Storing the web and bio moves following out of the dictionary for
+        # a moment, so a key is only missing if it is missing under the lock.
+        with self.source.lock:
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+            if key not in ('web', 'bio'):
+                raise KeyError(key)
+
+            # Fields set already are kept, and the fields are put in the
+            # order of a user read up front, with following last.
+            fields = dict(zip(('web', 'bio'),
+                              self.source.read_profile(self.offset)))
+            for field in ('web', 'bio', 'following'):
+                if dict.__contains__(self, field):
+                    fields[field] = dict.pop(self, field)
+            dict.update(self, fields)
+            return dict.__getitem__(self, key)
+
+    def load(self):
+        """(LazyUser) -> NoneType
+
+        Read this user's web and bio, if they have not been read yet.
+        """
+
+        self['web']
+        self['bio']
+
+    def get(self, key, default=None):
+        """(LazyUser, str, object) -> object
+
+        Return the value of key, or default if this user has no key.
+        """
+
+        if key in self:
+            return self[key]
+        return default
+
+    def __contains__(self, key):
+        """(LazyUser, object) -> bool
+
+        Return True iff key is a field of this user.
+        """
+
+        if key in ('web', 'bio') or dict.__contains__(self, key):
+            return True
+        with self.source.lock:
+            return dict.__contains__(self, key)
+
+    def __iter__(self):
+        """(LazyUser) -> iterator of str
+
+        Return an iterator over the fields of this user.
+        """
+
+        self.load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        """(LazyUser) -> int
+
+        Return the number of fields of this user.
+        """
+
+        self.load()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        """(LazyUser, object) -> bool
+
+        Return True iff other is a dict with the same fields as this user.
+        """
+
+        self.load()
+        if isinstance(other, LazyUser):
+            other.load()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        """(LazyUser, object) -> bool
+
+        Return True iff other is not a dict with the same fields as this
+        user.
+        """
+
+        self.load()
+        if isinstance(other, LazyUser):
+            other.load()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        """(LazyUser) -> str
+
+        Return the repr of this user's dictionary.
+        """
+
+        self.load()
+        return dict.__repr__(self)
+
+    def keys(self):
+        """(LazyUser) -> dict_keys
+
+        Return the fields of this user.
+        """
+
+        self.load()
+        return dict.keys(self)
+
+    def values(self):
+        """(LazyUser) -> dict_values
+
+        Return the values of this user's fields.
+        """
+
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        """(LazyUser) -> dict_items
+
+        Return the (field, value) pairs of this user.
+        """
+
+        self.load()
+        return dict.items(self)
+
+    def copy(self):
+        """(LazyUser) -> dict of {str: object}
+
+        Return a dict with the same fields as this user.
+        """
+
+        self.load()
+        return dict(dict.items(self))
+
+    def __reduce__(self):
+        """(LazyUser) -> tuple
+
+        Return how to pickle or copy this user: as a dict, since its source
+        cannot be.
+        """
+
+        return dict, (self.copy(),)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
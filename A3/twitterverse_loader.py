@@ -0,0 +1,482 @@
+"""
+Loading a TwitterverseGraph straight from a memory-mapped data file.
+
+load_graph maps a text data file into memory and splits it into records in
+bulk, decoding only each record's username and following lines, which are
+all that is needed to build the graph's IDs and edge arrays. The names,
+locations, webs and bios stay in the mapped file: the graph's profile
+columns are RecordColumns holding the byte offset of each user's record,
+and a field is decoded only when it is read, for instance by a name filter
+or the long presentation format.
+
+A large file can be parsed in parallel, in shards that end just after an
+'END' line, by a pool of worker processes. Each worker numbers the users of
+its shard with shard user IDs and returns its usernames and its edges
+already grouped into CSR arrays, which are merged in file order by copying
+each user's slices. An 'END' line is not always the end of a record, so a
+shard is only used as parsed if the shard before it was parsed right up to
+its start; otherwise it is parsed again from where that shard stopped.
+
+Records not in the usual layout (see twitterverse_lazy.iter_lazy_users)
+and every record after them are parsed by iter_users, with their fields
+decoded up front. The data file must not change while the graph is in use.
+"""
+
+import io
+import itertools
+import mmap
+import multiprocessing
+import os
+from array import array
+
+import twitterverse_functions as tf
+import twitterverse_graph as tg
+
+# The user dictionary key and the index among the lines of a record of the
+# profile field in each graph column.
+FIELD_LINES = {'names': ('name', 1), 'locations': ('location', 2),
+               'webs': ('web', 3), 'bios': ('bio', 4)}
+
+# The least number of bytes in a shard, below which a worker process is not
+# worth starting.
+MIN_SHARD_SIZE = 4 * tf.CHUNK_SIZE
+
+# The number of shards per worker process. Merging the shards' edges takes
+# a pass over the users of each shard, so there are no more than the workers
+# need.
+SHARDS_PER_JOB = 1
+
+
+class RecordColumn:
+    """A read-only sequence of one profile field of each user ID, decoded on
+    access from a memory-mapped data file."""
+
+    def __init__(self, buffer, encoding, record_offsets, line, values):
+        """(RecordColumn, mmap, str, array of int, int, dict of {int: str})
+            -> NoneType
+
+        Initialize the column of line line of the record starting at
+        record_offsets[user_id] of buffer, for each user ID. An offset of -1
+        means the field is values[user_id], or '' if there is none.
+        """
+
+        self.buffer = buffer
+        self.encoding = encoding
+        self.record_offsets = record_offsets
+        self.line = line
+        self.values = values
+
+    def __len__(self):
+        """(RecordColumn) -> int
+
+        Return the number of user IDs in this column.
+        """
+
+        return len(self.record_offsets)
+
+    def __getitem__(self, user_id):
+        """(RecordColumn, int) -> str
+
+        Return the field of user_id in this column.
+        """
+
+        if user_id < 0 or user_id >= len(self):
+            raise IndexError(user_id)
+
+        offset = self.record_offsets[user_id]
+        if offset == -1:
+            return self.values.get(user_id, '')
+
+        head_end = self.buffer.find(b'\nENDBIO', offset)
+        fields = self.buffer[offset:head_end].split(b'\n', 4)
+        if self.line == 4:
+            if len(fields) < 5:
+                return ''
+            return fields[4].decode(self.encoding)
+        return fields[self.line].decode(self.encoding).strip()
+
+
+def shard_bounds(buffer, shard_count):
+    """(mmap, int) -> list of (int, int)
+
+    Return the (start, end) byte offsets of at most shard_count shards of
+    about equal size covering buffer, each but the last ending just after an
+    'END' line.
+
+    >>> shard_bounds(b'a\\nA\\n\\n\\nENDBIO\\nEND\\n'\
+    b'b\\nB\\n\\n\\nENDBIO\\nEND\\n', 2)
+    [(0, 17), (17, 34)]
+    """
+
+    bounds = []
+    start = 0
+    for shard in range(1, shard_count):
+        end = buffer.find(b'\nEND\n', max(start, len(buffer) * shard //
+                                           shard_count - len(b'\nEND\n')))
+        if end == -1 or end + len(b'\nEND\n') >= len(buffer):
+            break
+        bounds.append((start, end + len(b'\nEND\n')))
+        start = end + len(b'\nEND\n')
+
+    bounds.append((start, len(buffer)))
+    return bounds
+
+
+def load_graph(data_filename, encoding='utf-8', jobs=1, shard_count=None):
+    """(str, str, int, int) -> TwitterverseGraph
+
+    Return the TwitterverseGraph of the data file data_filename, in
+    encoding encoding (one of twitterverse_lazy.LAZY_ENCODINGS), with its
+    profile fields left in the mapped file until they are read.
+
+    The file is parsed in shard_count shards (see shard_bounds) by jobs
+    forked worker processes (0 for one per CPU), or in this process if jobs
+    is 1 or processes cannot be forked. If shard_count is None, it is
+    SHARDS_PER_JOB per job, but no more than one per MIN_SHARD_SIZE bytes.
+
+    >>> import tempfile
+    >>> data_file = tempfile.NamedTemporaryFile('w')
+    >>> print('a\\nAl\\nTO\\nweb\\nHi\\nENDBIO\\nb\\nEND', file=data_file,\
+    flush=True)
+    >>> graph = load_graph(data_file.name)
+    >>> graph.usernames, list(graph.following(0)), graph.bios[0]
+    (['a', 'b'], [1], 'Hi')
+    >>> data_file.close()
+    """
+
+    data_bytes = open(data_filename, 'rb')
+    try:
+        buffer = mmap.mmap(data_bytes.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # An empty file cannot be mapped, and holds no users.
+        data_bytes.close()
+        return tg.TwitterverseGraph()
+    data_bytes.close()
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if shard_count is None:
+        shard_count = max(1, min(jobs * SHARDS_PER_JOB,
+                                 len(buffer) // MIN_SHARD_SIZE))
+
+    bounds = shard_bounds(buffer, shard_count)
+    shards = [(data_filename, start, end, encoding) for start, end in bounds]
+
+    pool = None
+    if jobs > 1 and len(shards) > 1 and \
+       'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(min(jobs,
+                                                            len(shards)))
+        results = pool.imap(_parse_shard, shards)
+    else:
+        results = map(_parse_shard, shards)
+
+    graph = tg.TwitterverseGraph()
+    parts = []
+    offsets = {}
+
+    # position is where a parse of the whole file would be, in bytes.
+    position = 0
+    status = 'parsed'
+
+    try:
+        for (start, end), result in zip(bounds, results):
+            if start != position:
+                # The shard before ended on an 'END' line that was not the
+                # end of a record, so this one is parsed again from there.
+                result = _parse_shard((data_filename, position, end,
+                                       encoding))
+                start = position
+
+            usernames, record_ids, record_offsets, edges, parsed_size, \
+                status = result
+
+            # Shard user IDs are numbered in the same order as graph ones,
+            # so interning them in order keeps the graph's order.
+            user_ids = array('i', map(graph.intern, usernames))
+            for user_id, offset in zip(record_ids, record_offsets):
+                graph.has_record[user_ids[user_id]] = 1
+                offsets[user_ids[user_id]] = offset
+            parts.append((user_ids, record_ids, edges))
+
+            position = start + parsed_size
+            if status != 'parsed':
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # From the first record not in the usual layout, and after the last
+    # 'END' line, the file is read by iter_users, into a part of its own.
+    values = {}
+    for column in FIELD_LINES:
+        values[column] = {}
+    if status != 'ended' and position < len(buffer):
+        rest = io.TextIOWrapper(io.BytesIO(buffer[position:]), encoding)
+        rest_graph = tg.TwitterverseGraph()
+        sources = array('i')
+        targets = array('i')
+        replaced = {}
+        for username, user in tf.iter_users(rest):
+            rest_id = _add_record(rest_graph, username, user['following'],
+                                  sources, targets, replaced)
+            for column in FIELD_LINES:
+                getattr(rest_graph, column)[rest_id] = \
+                    user[FIELD_LINES[column][0]]
+        tg.set_edges(rest_graph, sources, targets, replaced)
+
+        user_ids = array('i', map(graph.intern, rest_graph.usernames))
+        record_ids = array('i', [rest_id for rest_id in range(len(rest_graph))
+                                 if rest_graph.has_record[rest_id] == 1])
+        for rest_id in record_ids:
+            user_id = user_ids[rest_id]
+            graph.has_record[user_id] = 1
+            offsets.pop(user_id, None)
+            for column in FIELD_LINES:
+                values[column][user_id] = getattr(rest_graph, column)[rest_id]
+        parts.append((user_ids, record_ids, _edge_arrays(rest_graph)))
+
+    _merge_edges(graph, parts)
+
+    # Records read by iter_users have offset -1 and their fields in values.
+    column_offsets = array('q', [-1]) * len(graph)
+    for user_id in offsets:
+        column_offsets[user_id] = offsets[user_id]
+    for column in FIELD_LINES:
+        setattr(graph, column, RecordColumn(buffer, encoding, column_offsets,
+                                            FIELD_LINES[column][1],
+                                            values[column]))
+
+    return graph
+
+
+def _parse_shard(shard):
+    """((str, int, int, str)) -> (list of str, array of int, array of int,
+        tuple of array of int, int, str)
+
+    Parse the shard (data_filename, start, end, encoding) of a data file,
+    where start is the start of a record, up to its end or its first record
+    not in the usual layout. Return a tuple of the usernames in the shard, in
+    the order a TwitterverseGraph would number them; the shard user IDs of
+    its records, in that numbering, and their byte offsets; the edge arrays
+    of the shard's records on their own (see _edge_arrays); the number of
+    bytes parsed; and 'parsed', 'irregular' if a record not in the usual
+    layout was found, or 'ended' if a blank username ended the users.
+    """
+
+    data_filename, start, end, encoding = shard
+
+    data_file = open(data_filename, 'rb')
+    buffer = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+    data_file.close()
+
+    shard_graph = tg.TwitterverseGraph()
+    record_ids = array('i')
+    record_offsets = array('q')
+    sources = array('i')
+    targets = array('i')
+    replaced = {}
+    position = start
+    status = 'parsed'
+
+    # Only one record at a time is copied out of the mapped file.
+    record_end = buffer.find(b'\nEND\n', position, end)
+    while record_end != -1:
+        piece = buffer[position:record_end]
+        parsed = None
+        if b'\r' not in piece:
+            parsed = _parse_record(piece, encoding)
+        if parsed is None:
+            status = 'irregular'
+            break
+        if parsed[0] == '':
+            status = 'ended'
+            break
+
+        record_ids.append(_add_record(shard_graph, parsed[0], parsed[1],
+                                      sources, targets, replaced))
+        record_offsets.append(position)
+        position = record_end + len(b'\nEND\n')
+        record_end = buffer.find(b'\nEND\n', position, end)
+
+    buffer.close()
+    tg.set_edges(shard_graph, sources, targets, replaced)
+    return (shard_graph.usernames, record_ids, record_offsets,
+            _edge_arrays(shard_graph), position - start, status)
+
+
+def _add_record(graph, username, following, sources, targets, replaced):
+    """(TwitterverseGraph, str, list of str, array of int, array of int,
+        dict of {int: int}) -> int
+
+    Record in graph that username has a record following the users in
+    following, appending its edges to sources and targets and noting in
+    replaced where they start if it had a record already, as set_edges
+    expects. Return the user ID of username.
+    """
+
+    user_id = graph.intern(username)
+    if graph.has_record[user_id] == 1:
+        replaced[user_id] = len(sources)
+    graph.has_record[user_id] = 1
+    sources.extend(itertools.repeat(user_id, len(following)))
+    targets.extend(map(graph.intern, following))
+    return user_id
+
+
+def _edge_arrays(graph):
+    """(TwitterverseGraph) -> tuple of array of int
+
+    Return the following offsets and targets and the follower offsets and
+    sources of graph.
+    """
+
+    return (graph.following_offsets, graph.following_targets,
+            graph.follower_offsets, graph.follower_sources)
+
+
+def _merge_edges(graph, parts):
+    """(TwitterverseGraph, list of (array of int, array of int,
+        tuple of array of int)) -> NoneType
+
+    Set the edge arrays of graph to those of parts, given in file order.
+    Each part is a tuple of an array mapping its user IDs to graph ones, its
+    user IDs that have records, and its edge arrays (see _edge_arrays). The
+    edges of a user with records in several parts are those of the last.
+
+    >>> a_part = tg.build_graph([('a', '', '', '', '', ['b', 'a'])])
+    >>> b_part = tg.build_graph([('b', '', '', '', '', ['a'])])
+    >>> graph = tg.build_graph([('a', '', '', '', '', ['b'])])
+    >>> _merge_edges(graph, [(array('i', [0, 1]), [0], _edge_arrays(a_part)),\
+    (array('i', [1, 0]), [0], _edge_arrays(b_part))])
+    >>> list(graph.following(0)), list(graph.followers(0))
+    ([1, 0], [0, 1])
+    """
+
+    if len(parts) == 1 and len(parts[0][0]) == len(graph):
+        # A single part is numbered by graph user IDs already.
+        (graph.following_offsets, graph.following_targets,
+         graph.follower_offsets, graph.follower_sources) = parts[0][2]
+        return
+
+    last_part = array('i', [-1]) * len(graph)
+    for part in range(len(parts)):
+        user_ids, record_ids, edges = parts[part]
+        for user_id in record_ids:
+            last_part[user_ids[user_id]] = part
+
+    following_parts = []
+    follower_parts = []
+    for part in range(len(parts)):
+        user_ids, record_ids, edges = parts[part]
+        following_offsets, following_targets, follower_offsets, \
+            follower_sources = edges
+
+        # Edges from a record that a later part replaces are dropped.
+        replaced = set(user_id for user_id in record_ids
+                       if last_part[user_ids[user_id]] != part)
+        if len(replaced) > 0:
+            following_offsets, following_targets = _drop_users(
+                following_offsets, following_targets, replaced, True)
+            follower_offsets, follower_sources = _drop_users(
+                follower_offsets, follower_sources, replaced, False)
+
+        following_parts.append((user_ids, following_offsets,
+                                following_targets))
+        follower_parts.append((user_ids, follower_offsets, follower_sources))
+
+    graph.following_offsets, graph.following_targets = \
+        _merge_groups(len(graph), following_parts)
+    graph.follower_offsets, graph.follower_sources = \
+        _merge_groups(len(graph), follower_parts)
+
+
+def _drop_users(offsets, values, user_ids, by_group):
+    """(array of int, array of int, set of int, bool)
+        -> (array of int, array of int)
+
+    Return the CSR (offsets, values) arrays without the groups of the user
+    IDs in user_ids if by_group is True, or without the values in user_ids
+    if it is False.
+
+    >>> _drop_users(array('i', [0, 1, 3]), array('i', [1, 0, 1]), {0}, True)
+    (array('i', [0, 0, 2]), array('i', [0, 1]))
+    >>> _drop_users(array('i', [0, 1, 3]), array('i', [1, 0, 1]), {0}, False)
+    (array('i', [0, 1, 2]), array('i', [1, 1]))
+    """
+
+    kept_offsets = array('i', [0])
+    kept_values = array('i')
+    for user_id in range(len(offsets) - 1):
+        group = values[offsets[user_id]:offsets[user_id + 1]]
+        if not by_group:
+            kept_values.extend(value for value in group
+                               if value not in user_ids)
+        elif user_id not in user_ids:
+            kept_values.extend(group)
+        kept_offsets.append(len(kept_values))
+    return kept_offsets, kept_values
+
+
+def _merge_groups(size, parts):
+    """(int, list of (array of int, array of int, array of int))
+        -> (array of int, array of int)
+
+    Return the CSR (offsets, values) arrays over size graph user IDs that
+    group together, for each user, its groups in each (user_ids, offsets,
+    values) CSR part of parts, in the order of parts, with their keys and
+    values mapped to graph user IDs through user_ids.
+    """
+
+    counts = array('i', bytes(4 * (size + 1)))
+    for user_ids, offsets, values in parts:
+        for user_id, start, end in zip(user_ids, offsets, offsets[1:]):
+            if start < end:
+                counts[user_id + 1] += end - start
+    for i in range(size):
+        counts[i + 1] += counts[i]
+
+    merged = array('i', bytes(4 * counts[size]))
+    position = array('i', counts)
+    for user_ids, offsets, values in parts:
+        values = array('i', map(user_ids.__getitem__, values))
+        for user_id, start, end in zip(user_ids, offsets, offsets[1:]):
+            if start < end:
+                merged_start = position[user_id]
+                position[user_id] = merged_start + end - start
+                merged[merged_start:merged_start + end - start] = \
+                    values[start:end]
+    return counts, merged
+
+
+def _parse_record(piece, encoding):
+    """(bytes, str) -> (str, list of str) or NoneType
+
+    Return the username and following list of the user record in piece,
+    the bytes of one record before its 'END' line. The username is '' if
+    there are no more users. Return None if piece is not laid out as a
+    single record.
+    """
+
+    head, endbio, following = piece.partition(b'\nENDBIO')
+    fields = head.split(b'\n', 4)
+    username = fields[0].decode(encoding).strip()
+
+    if username == '':
+        return '', None
+    if endbio == b'' or len(fields) < 4 or \
+       following[0:1] not in (b'', b'\n'):
+        return None
+
+    following = [line.strip() for line in
+                 following.decode(encoding).split('\n')[1:]]
+    if 'END' in following:
+        return None
+
+    return username, following
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,213 @@
+"""
+Per-stage profiling of Twitterverse queries.
+
+While a QueryProfile is enabled in a thread, the stage functions of
+twitterverse_functions report each call made in that thread to it (see
+twitterverse_functions.set_profiler), and it records, for each stage, the
+number of calls, the wall time spent and the number of users handled. It
+also counts the scans of the whole twitterverse for followers (by
+all_followers, expand_frontier or follower_counts, when they are given no
+follower index), the calls to the comparison functions made by sorts and
+the sort keys computed in their place. While no profile is enabled, each
+stage function only checks that none is.
+
+The stages are:
+
+    - "parse": process_data (users read)
+    - "search": get_search_results (users found)
+    - "filter": get_filter_results (users filtered)
+    - "sort": tweet_sort and top_users (users sorted)
+    - "present": iter_present_chunks, and so get_present_string and
+      write_present, including sorting (users presented)
+
+The work is recorded both in the profile's totals and under the query
+named by the last call to start_query, so each query gets a report of its
+own.
+
+Only calls to the twitterverse_functions module are seen, and only calls
+made in the thread the profile was enabled in are counted, so queries run
+in other threads or processes at the same time are not. On a
+TwitterverseGraph, loading, searching and filtering are done by
+twitterverse_graph and the loaders and are not profiled, but the sort and
+present stages are, as twitterverse_graph.iter_present_chunks presents the
+results through twitterverse_functions.iter_present_chunks. Lazy loading
+is profiled as the parse stage too.
+"""
+
+import json
+
+import twitterverse_functions as tf
+
+STAGES = ['parse', 'search', 'filter', 'sort', 'present']
+
+COUNTERS = ['follower_scans', 'comparisons', 'sort_keys']
+
+
+class QueryProfile:
+    """Counters for the stages of the queries run in one thread while it is
+    enabled."""
+
+    def __init__(self):
+        """(QueryProfile) -> NoneType
+
+        Initialize a disabled profile with every counter at zero.
+        """
+
+        self.totals = _new_counters()
+        self.queries = {}
+        self.query_counters = None
+
+    def __enter__(self):
+        """(QueryProfile) -> QueryProfile
+
+        Enable this profile and return it.
+        """
+
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """(QueryProfile, type, Exception, traceback) -> NoneType
+
+        Disable this profile.
+        """
+
+        self.disable()
+
+    def enable(self):
+        """(QueryProfile) -> NoneType
+
+        Start counting the calls to the stage functions in
+        twitterverse_functions made in this thread. Raise ValueError if a
+        profile is already enabled in this thread.
+        """
+
+        if tf.get_profiler() is not None:
+            raise ValueError('a profile is already enabled')
+        tf.set_profiler(self)
+
+    def disable(self):
+        """(QueryProfile) -> NoneType
+
+        Stop counting, if this profile is enabled in this thread.
+        """
+
+        if tf.get_profiler() is self:
+            tf.set_profiler(None)
+
+    def start_query(self, query):
+        """(QueryProfile, str) -> NoneType
+
+        Record the work done from now on under query as well as in the
+        totals, adding to what was recorded under query before.
+        """
+
+        if query not in self.queries:
+            self.queries[query] = _new_counters()
+        self.query_counters = self.queries[query]
+
+    def record(self, stage, calls, seconds, users):
+        """(QueryProfile, str, int, float, int) -> NoneType
+
+        Add calls calls, seconds seconds and users users to stage.
+        """
+
+        for counters in (self.totals, self.query_counters):
+            if counters is not None:
+                stage_counters = counters['stages'][stage]
+                stage_counters['calls'] += calls
+                stage_counters['seconds'] += seconds
+                stage_counters['users'] += users
+
+    def count(self, counter, count):
+        """(QueryProfile, str, int) -> NoneType
+
+        Add count to counter, one of COUNTERS.
+        """
+
+        for counters in (self.totals, self.query_counters):
+            if counters is not None:
+                counters[counter] += count
+
+    def report(self):
+        """(QueryProfile) -> dict of {str: object}
+
+        Return the counters of this profile: key "stages" maps each stage to
+        a dict of its calls, seconds and users, keys "follower_scans",
+        "comparisons" and "sort_keys" map to those counts, and key "queries"
+        maps each query passed to start_query to a dict of the same counters
+        for it alone.
+
+        >>> twv = {\
+        'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':[]},\
+        'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':['a']}}
+        >>> with QueryProfile() as profile:
+        ...     profile.start_query('q1')
+        ...     users = tf.get_search_results(twv, {'username': 'b',\
+        'operations': ['following', 'followers']})
+        ...     profile.start_query('q2')
+        ...     result = tf.get_present_string(twv, users,\
+        {'sort-by': 'popularity', 'format': 'short'})
+        >>> report = profile.report()
+        >>> report['stages']['search']['users'], report['follower_scans']
+        (1, 1)
+        >>> report['stages']['present']['calls'], report['comparisons']
+        (1, 0)
+        >>> sorted(report['queries'])
+        ['q1', 'q2']
+        >>> report['queries']['q2']['stages']['search']['calls']
+        0
+        """
+
+        report = _copy_counters(self.totals)
+        report['queries'] = {}
+        for query in self.queries:
+            report['queries'][query] = _copy_counters(self.queries[query])
+        return report
+
+
+def _new_counters():
+    """() -> dict of {str: object}
+
+    Return a dict of counters at zero, in the form of QueryProfile.report
+    without its key "queries".
+    """
+
+    counters = {'stages': {}}
+    for stage in STAGES:
+        counters['stages'][stage] = {'calls': 0, 'seconds': 0.0, 'users': 0}
+    for counter in COUNTERS:
+        counters[counter] = 0
+    return counters
+
+
+def _copy_counters(counters):
+    """(dict of {str: object}) -> dict of {str: object}
+
+    Return a copy of counters, as returned by _new_counters.
+    """
+
+    copy = dict(counters)
+    copy['stages'] = {}
+    for stage in STAGES:
+        copy['stages'][stage] = dict(counters['stages'][stage])
+    return copy
+
+
+def format_report(report):
+    """(dict of {str: object}) -> str
+
+    Return report, as returned by QueryProfile.report, as JSON text.
+
+    >>> print(format_report({'follower_scans': 0}))
+    {
+      "follower_scans": 0
+    }
+    """
+
+    return json.dumps(report, indent=2)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
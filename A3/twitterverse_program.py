@@ -1,21 +1,366 @@
+import argparse
+import gc
+import itertools
+import multiprocessing
+import os
+import sys
+
+import twitterverse_cache as tc
 import twitterverse_functions as tf
+import twitterverse_graph as tg
+import twitterverse_lazy as tz
+import twitterverse_loader as tl
+import twitterverse_profile as tp
+import twitterverse_records as tr
+import twitterverse_snapshot as ts
+import twitterverse_updates as tu
+
+
+def load_data(data_filename, as_dict=False, compact=False, lazy=False,
+              mapped=False, jobs=1):
+    """(str, bool, bool, bool, bool, int) -> (Twitterverse dictionary or
+        TwitterverseGraph or RecordStore, follower index)
+
+    Load the twitterverse in data_filename and return it with its follower
+    index. A snapshot file is loaded as a TwitterverseGraph, which needs no
+    follower index, so None is returned in its place, unless as_dict is True.
+    If compact is True, either kind of file is loaded as a read-only
+    RecordStore, returned with its FollowerView as the follower index.
+    Otherwise, if lazy is True, the webs and bios of a text data file are
+    only read when first looked up. If mapped is True and as_dict is not, a
+    text data file is loaded from memory as a TwitterverseGraph, as a
+    snapshot is, in shards parsed by jobs worker processes.
+    """
+
+    data_file = open(data_filename, 'rb')
+    is_snapshot = data_file.read(len(ts.MAGIC)) == ts.MAGIC
+    if is_snapshot and as_dict:
+        data = ts.load_snapshot(data_file)
+    elif is_snapshot:
+        data = ts.load_graph(data_file)
+    data_file.close()
+
+    if is_snapshot and as_dict:
+        return data, tf.build_follower_index(data)
+    if mapped and not is_snapshot and not as_dict:
+        # The graph is then used as a snapshot's is.
+        data = tl.load_graph(data_filename, jobs=jobs)
+        is_snapshot = True
+    if is_snapshot and compact:
+        data = tr.records_from_graph(data)
+        return data, data.follower_view()
+    if is_snapshot:
+        return data, None
 
-if __name__ == '__main__':
-    
-    data_filename = input('Data file: ')
     data_file = open(data_filename, 'r')
-    data = tf.process_data(data_file)
+    if compact:
+        data = tr.process_records(data_file)
+        follower_index = data.follower_view()
+    elif lazy:
+        data, follower_index = tz.process_data(data_file, True)
+    else:
+        data, follower_index = tf.process_data(data_file, True)
     data_file.close()
-    
-    query_filename = input('Query file: ')
+    return data, follower_index
+
+
+def get_query_string(data, follower_index, query, text_index=None):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index,
+        query dictionary, text index) -> str
+
+    Run query on data and return the presentation string of its results.
+    text_index, if given, is used to filter a Twitterverse dictionary.
+    """
+
+    return ''.join(iter_query_chunks(data, follower_index, query, text_index))
+
+
+def iter_query_chunks(data, follower_index, query, text_index=None,
+                      cache=None):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index,
+        query dictionary, text index, QueryCache) -> generator of str
+
+    Run query on data and yield the presentation string of its results in
+    pieces. text_index, if given, is used to filter a Twitterverse
+    dictionary, and cache, if given, supplies the filter results of a
+    Twitterverse dictionary.
+    """
+
+    if isinstance(data, tg.TwitterverseGraph):
+        search_results = tg.get_search_results(data, query['search'])
+        filtered_results = tg.get_filter_results(data, search_results,
+                                                 query['filter'])
+        return tg.iter_present_chunks(data, filtered_results,
+                                      query['present'])
+
+    if cache is not None:
+        filtered_results = cache.get_filter_results(query['search'],
+                                                    query['filter'])
+    else:
+        search_results = tf.get_search_results(data, query['search'],
+                                               follower_index)
+        filtered_results = tf.get_filter_results(data, search_results,
+                                                 query['filter'],
+                                                 follower_index, text_index)
+    return tf.iter_present_chunks(data, filtered_results, query['present'],
+                                  follower_index)
+
+
+def read_query(query_filename):
+    """(str) -> query dictionary
+
+    Return the query dictionary of the query file query_filename.
+    """
+
     query_file = open(query_filename, 'r')
     query = tf.process_query(query_file)
     query_file.close()
-        
-    search_results = tf.get_search_results(data, query['search'])
-    filtered_results = tf.get_filter_results(data, search_results, 
-                                             query['filter'])
-    presented_results = tf.get_present_string(data, filtered_results, 
-                                              query['present'])
-    
-    print(presented_results, end="")
+    return query
+
+
+def expand_query_filenames(paths):
+    """(list of str) -> list of str
+
+    Return the query filenames in paths, where each directory in paths is
+    replaced by the files in it, in sorted order.
+    """
+
+    query_filenames = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, filename)):
+                    query_filenames.append(os.path.join(path, filename))
+        else:
+            query_filenames.append(path)
+
+    return query_filenames
+
+
+# The data and follower index shared with forked worker processes.
+_worker_data = None
+
+
+def get_query_file_results(data, follower_index, query_filename,
+                           text_index=None, cache=None):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index, str,
+        text index, QueryCache) -> (iterable of str, str)
+
+    Run the query file query_filename on data and return a tuple of the
+    pieces of its presentation string and None. If the query names a user
+    that has no record, or has a limit that is not a non-negative int,
+    return None and an error message instead.
+    """
+
+    # Any missing user is found before the first piece is produced.
+    try:
+        chunks = iter_query_chunks(data, follower_index,
+                                   read_query(query_filename), text_index,
+                                   cache)
+        first_chunk = next(chunks, '')
+    except KeyError as error:
+        return None, '{0}: no record for user {1}'.format(query_filename,
+                                                         error)
+    except ValueError as error:
+        return None, '{0}: {1}'.format(query_filename, error)
+
+    return itertools.chain([first_chunk], chunks), None
+
+
+def _get_worker_results(query_filename):
+    """(str) -> (list of str, str)
+
+    Return get_query_file_results for query_filename on the data shared with
+    this worker process, with the presentation string in one piece.
+    """
+
+    data, follower_index, text_index, cache = _worker_data
+    chunks, error = get_query_file_results(data, follower_index,
+                                           query_filename, text_index, cache)
+    if chunks is not None:
+        chunks = [''.join(chunks)]
+    return chunks, error
+
+
+def _iter_query_file_results(data, follower_index, query_filenames,
+                             text_index=None, cache=None, profile=None):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index,
+        list of str, text index, QueryCache, QueryProfile)
+        -> generator of (iterable of str, str)
+
+    Yield get_query_file_results for each query file in query_filenames in
+    turn. If profile is given, the work done for each query, up to when the
+    next one is asked for, is recorded in profile under its filename.
+    """
+
+    for query_filename in query_filenames:
+        if profile is not None:
+            profile.start_query(query_filename)
+        yield get_query_file_results(data, follower_index, query_filename,
+                                     text_index, cache)
+
+
+def run_batch(data, follower_index, query_filenames, output_dir=None,
+              jobs=1, text_index=None, profile=None):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index,
+        list of str, str, int, text index, QueryProfile) -> NoneType
+
+    Run each query file in query_filenames on data. If output_dir is None,
+    print each presentation string after a line naming its query file,
+    ending it with a newline if it has none; otherwise write it to a file in
+    output_dir named after the query file with '.out' appended. Results are
+    written as they are formatted. A query naming a user that has no record,
+    or with a limit that is not a non-negative int, is reported on stderr
+    and skipped.
+
+    Queries on a Twitterverse dictionary share a QueryCache, so repeated
+    search and filter blocks are only run once (per worker process).
+
+    If jobs is more than 1, the queries are run by that many forked worker
+    processes, which share data with this process copy-on-write. Results
+    are still output in the order of query_filenames. Where processes
+    cannot be forked, the queries are run in this process.
+
+    If profile is given, the queries are run in this process, and the work
+    of each is recorded in profile under its query filename.
+    """
+
+    global _worker_data
+
+    cache = None
+    if not isinstance(data, tg.TwitterverseGraph):
+        cache = tc.QueryCache(data, follower_index, text_index)
+
+    pool = None
+    if (jobs > 1 and profile is None and
+            'fork' in multiprocessing.get_all_start_methods()):
+        _worker_data = (data, follower_index, text_index, cache)
+        # Keep the garbage collector from writing to, and so copying, the
+        # pages of the shared data in every worker.
+        gc.freeze()
+        pool = multiprocessing.get_context('fork').Pool(jobs)
+        results = pool.imap(_get_worker_results, query_filenames,
+                            max(1, len(query_filenames) // (jobs * 4)))
+    else:
+        results = _iter_query_file_results(data, follower_index,
+                                           query_filenames, text_index, cache,
+                                           profile)
+
+    try:
+        for query_filename, (chunks, error) in zip(query_filenames, results):
+            if error is not None:
+                print(error, file=sys.stderr)
+            elif output_dir is None:
+                print('==> {0} <=='.format(query_filename))
+                last_chunk = '\n'
+                for chunk in chunks:
+                    if chunk != '':
+                        sys.stdout.write(chunk)
+                        last_chunk = chunk
+                # The next header starts on a line of its own.
+                if not last_chunk.endswith('\n'):
+                    print()
+            else:
+                output_file = open(os.path.join(
+                    output_dir, os.path.basename(query_filename) + '.out'),
+                    'w')
+                output_file.writelines(chunks)
+                output_file.close()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+            gc.unfreeze()
+            _worker_data = None
+
+
+def main(args):
+    """(list of str) -> NoneType
+
+    Load the data file named in args once and run every query file named in
+    args on it.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Run Twitterverse queries against one data file.')
+    parser.add_argument('data_file', help='text data file or snapshot')
+    parser.add_argument('queries', nargs='+',
+                        help='query files, or directories of query files')
+    parser.add_argument('-o', '--output-dir',
+                        help='write each result to OUTPUT_DIR/<query>.out')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes for the queries, '
+                        'and for loading with --mmap (0 for one per CPU)')
+    parser.add_argument('-d', '--deltas', action='append', default=[],
+                        help='delta log to apply before running the queries')
+    parser.add_argument('-p', '--profile', action='store_true',
+                        help='report the time and work of each query stage '
+                        'on stderr (runs the queries in this process)')
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help='hold the data in compact read-only records')
+    parser.add_argument('-l', '--lazy', action='store_true',
+                        help='read webs and bios only when they are shown')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='load a text data file from memory as a graph')
+    options = parser.parse_args(args)
+
+    if options.compact and len(options.deltas) > 0:
+        parser.error('--compact records cannot be changed by --deltas')
+    if options.mmap and len(options.deltas) > 0:
+        parser.error('--mmap graphs cannot be changed by --deltas')
+
+    if options.profile:
+        options.jobs = 1
+        with tp.QueryProfile() as profile:
+            _run_main(options, profile)
+        print(tp.format_report(profile.report()), file=sys.stderr)
+    else:
+        _run_main(options)
+
+
+def _run_main(options, profile=None):
+    """(argparse.Namespace, QueryProfile) -> NoneType
+
+    Load the data file and run the queries named in options, the parsed
+    arguments of main, recording the work of each query in profile if it
+    is given.
+    """
+
+    jobs = options.jobs
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    data, follower_index = load_data(options.data_file,
+                                     len(options.deltas) > 0,
+                                     options.compact, options.lazy,
+                                     options.mmap, jobs)
+    for delta_filename in options.deltas:
+        delta_file = open(delta_filename, 'r')
+        tu.replay_deltas(data, delta_file, follower_index)
+        delta_file.close()
+
+    query_filenames = expand_query_filenames(options.queries)
+
+    # The text index only pays for itself over many queries.
+    text_index = None
+    if len(query_filenames) > 1 and not isinstance(data, tg.TwitterverseGraph):
+        text_index = tf.build_text_index(data)
+
+    run_batch(data, follower_index, query_filenames, options.output_dir,
+              jobs, text_index, profile)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+
+    else:
+        data_filename = input('Data file: ')
+        data, follower_index = load_data(data_filename)
+
+        query_filename = input('Query file: ')
+        query = read_query(query_filename)
+
+        sys.stdout.writelines(iter_query_chunks(data, follower_index, query))
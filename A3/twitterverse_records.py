@@ -0,0 +1,242 @@
+"""
+Compact, read-only Twitterverse records.
+
+A RecordStore holds a Twitterverse in the columns of a TwitterverseGraph:
+one list per profile field, with names and locations interned so that
+repeated values share one str, and the following lists as array('i') user
+IDs. Indexing it gives a UserRecord, a two-slot view of one user's row that
+looks up each field only when asked for it, so that
+
+    store[username]['name']
+
+works as it does on a Twitterverse dictionary, and the functions of
+twitterverse_functions can take a RecordStore in place of one. A
+FollowerView of the same graph can stand in for the follower index.
+
+The records cannot be changed, so twitterverse_updates cannot be used on a
+RecordStore.
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping
+
+import twitterverse_functions as tf
+import twitterverse_graph as tg
+
+# The TwitterverseGraph column holding each profile field.
+COLUMNS = {'name': 'names', 'location': 'locations', 'web': 'webs',
+           'bio': 'bios'}
+
+
+class UserRecord(Mapping):
+    """A read-only view of one user's record in a TwitterverseGraph."""
+
+    __slots__ = ('graph', 'user_id')
+
+    def __init__(self, graph, user_id):
+        """(UserRecord, TwitterverseGraph, int) -> NoneType
+
+        Initialize a view of the record of user_id in graph.
+        """
+
+        self.graph = graph
+        self.user_id = user_id
+
+    def __getitem__(self, field):
+        """(UserRecord, str) -> object
+
+        Return field of this record: a str for a profile field, or a new
+        list of the usernames followed for 'following'. Raise KeyError if
+        field is not a field of a user dictionary.
+        """
+
+        if field == 'following':
+            usernames = self.graph.usernames
+            return [usernames[followed] for followed in
+                    self.graph.following(self.user_id)]
+        return getattr(self.graph, COLUMNS[field])[self.user_id]
+
+    def __iter__(self):
+        """(UserRecord) -> iterator of str
+
+        Return an iterator over the fields of this record.
+        """
+
+        return iter(['name', 'location', 'web', 'bio', 'following'])
+
+    def __len__(self):
+        """(UserRecord) -> int
+
+        Return the number of fields of this record.
+        """
+
+        return 5
+
+    def __repr__(self):
+        """(UserRecord) -> str
+
+        Return the repr of this record as a user dictionary.
+        """
+
+        return repr(dict(self))
+
+
+class RecordStore(Mapping):
+    """A read-only Twitterverse dictionary backed by a TwitterverseGraph."""
+
+    def __init__(self, graph, record_ids=None):
+        """(RecordStore, TwitterverseGraph, array of int) -> NoneType
+
+        Initialize a store of the users with a record in graph, iterated in
+        the order of record_ids, or in user ID order if it is None.
+        """
+
+        self.graph = graph
+        if record_ids is None:
+            record_ids = array('i', [user_id for user_id in range(len(graph))
+                                     if graph.has_record[user_id] == 1])
+        self.record_ids = record_ids
+
+    def __getitem__(self, username):
+        """(RecordStore, str) -> UserRecord
+
+        Return the record of username. Raise KeyError if username has no
+        record.
+        """
+
+        return UserRecord(self.graph, self.graph.profile(username))
+
+    def __contains__(self, username):
+        """(RecordStore, str) -> bool
+
+        Return True iff username has a record in this store.
+        """
+
+        return username in self.graph
+
+    def __iter__(self):
+        """(RecordStore) -> iterator of str
+
+        Return an iterator over the usernames with a record in this store.
+        """
+
+        usernames = self.graph.usernames
+        return (usernames[user_id] for user_id in self.record_ids)
+
+    def __len__(self):
+        """(RecordStore) -> int
+
+        Return the number of users with a record in this store.
+        """
+
+        return len(self.record_ids)
+
+    def follower_view(self):
+        """(RecordStore) -> FollowerView
+
+        Return a follower index of this store that reads the graph's
+        follower arrays instead of holding a set per user.
+        """
+
+        return FollowerView(self.graph)
+
+
+class FollowerView(Mapping):
+    """A read-only follower index backed by a TwitterverseGraph."""
+
+    __slots__ = ('graph',)
+
+    def __init__(self, graph):
+        """(FollowerView, TwitterverseGraph) -> NoneType
+
+        Initialize a follower index of graph.
+        """
+
+        self.graph = graph
+
+    def __getitem__(self, username):
+        """(FollowerView, str) -> set of str
+
+        Return a new set of the usernames following username. Raise KeyError
+        if no one follows username, as a follower index would.
+        """
+
+        user_id = self.graph.ids.get(username)
+        if user_id is None or self.graph.follower_count(user_id) == 0:
+            raise KeyError(username)
+        usernames = self.graph.usernames
+        return set([usernames[follower] for follower in
+                    self.graph.followers(user_id)])
+
+    def __iter__(self):
+        """(FollowerView) -> iterator of str
+
+        Return an iterator over the usernames followed by at least one user.
+        """
+
+        return (self.graph.usernames[user_id]
+                for user_id in range(len(self.graph))
+                if self.graph.follower_count(user_id) > 0)
+
+    def __len__(self):
+        """(FollowerView) -> int
+
+        Return the number of users followed by at least one user.
+        """
+
+        return sum(1 for user_id in range(len(self.graph))
+                   if self.graph.follower_count(user_id) > 0)
+
+
+def process_records(data_file):
+    """(file open for reading) -> RecordStore
+
+    Read data_file, in the same format as process_data, and return a
+    RecordStore of its users, iterated in data file order.
+
+    >>> import io
+    >>> store = process_records(io.StringIO('b\\nBo\\nTO\\n\\nENDBIO\\na\\n'\
+    'END\\na\\nAl\\nTO\\n\\nENDBIO\\nEND\\n'))
+    >>> list(store), store['b']['following'], store['a']['name']
+    (['b', 'a'], ['a'], 'Al')
+    >>> store['a']['location'] is store['b']['location']
+    True
+    >>> tf.get_present_string(store, ['a', 'b'],\
+    {'sort-by': 'popularity', 'format': 'short'})
+    "['a', 'b']"
+    """
+
+    usernames = []
+
+    def records():
+        for username, user in tf.iter_users(data_file):
+            usernames.append(username)
+            yield (username, sys.intern(user['name']),
+                   sys.intern(user['location']), user['web'], user['bio'],
+                   user['following'])
+
+    graph = tg.build_graph(records())
+
+    # A repeated username keeps the place of its first record.
+    return RecordStore(graph, array('i', [graph.ids[username] for username
+                                          in dict.fromkeys(usernames)]))
+
+
+def records_from_graph(graph):
+    """(TwitterverseGraph) -> RecordStore
+
+    Return a RecordStore of the users with a record in graph, such as one
+    loaded from a snapshot, iterated in user ID order.
+
+    >>> graph = tg.build_graph([('a', 'A', '', '', '', ['b'])])
+    >>> dict(records_from_graph(graph)['a'])
+    {'name': 'A', 'location': '', 'web': '', 'bio': '', 'following': ['b']}
+    """
+
+    return RecordStore(graph)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
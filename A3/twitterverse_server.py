@@ -0,0 +1,287 @@
+"""
+A long-running Twitterverse query server.
+
+The server loads a data file or snapshot once and answers queries sent over
+a Unix socket or a localhost TCP port, so each query costs only its own
+work. Many clients can be connected at once, and each can send several
+queries without waiting for the answers, which come back in order.
+
+A request is a query in the query file format, ending with the blank line
+after its PRESENT section:
+
+    SEARCH
+    tomCruise
+    following
+    FILTER
+    name-includes tom
+    PRESENT
+    sort-by username
+    format short
+    <blank line>
+
+The response is either a line 'OK n' followed by the n bytes of the UTF-8
+encoded presentation string, or a single line 'ERROR message'.
+
+Queries are answered by a pool of worker threads, off the event loop, so
+a long query does not keep the server from accepting connections, reading
+requests or sending other answers; the threads share one QueryCache, which
+is thread-safe. At most max_in_flight queries may be running or waiting to
+run or for their answers to be sent; the server stops reading requests
+until one finishes.
+"""
+
+import argparse
+import asyncio
+import io
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import twitterverse_cache as tc
+import twitterverse_functions as tf
+import twitterverse_graph as tg
+import twitterverse_program as program
+
+
+def parse_request(text):
+    """(str) -> query dictionary
+
+    Return the query dictionary of the query text text. Raise ValueError if
+    text is not in the query file format.
+
+    >>> parse_request('SEARCH\\na\\nfollowing\\nFILTER\\nPRESENT\\n'\
+    'sort-by username\\nformat short\\n\\n')['search']
+    {'username': 'a', 'operations': ['following']}
+    >>> parse_request('SEARCH\\na\\nPRESENT\\n\\n')
+    Traceback (most recent call last):
+    ...
+    ValueError: query has no FILTER section
+    """
+
+    lines = [line.strip() for line in text.split('\n')]
+
+    # process_query reads until it finds each section, so check that they
+    # are all there before calling it.
+    if len(lines) < 2 or lines[0] != 'SEARCH':
+        raise ValueError('query does not start with SEARCH')
+    if 'FILTER' not in lines[2:]:
+        raise ValueError('query has no FILTER section')
+    filter_start = lines.index('FILTER', 2)
+    if 'PRESENT' not in lines[filter_start:]:
+        raise ValueError('query has no PRESENT section')
+    present_start = lines.index('PRESENT', filter_start)
+    present_end = present_start + 1
+    while present_end < len(lines) and lines[present_end] != '':
+        present_end += 1
+
+    for line in lines[filter_start + 1:present_start] + \
+            lines[present_start + 1:present_end]:
+        if len(line.split()) < 2:
+            raise ValueError('not a filter or presentation line: '
+                             '{0}'.format(line))
+
+    query = tf.process_query(io.StringIO(text))
+    for key in ['sort-by', 'format']:
+        if key not in query['present']:
+            raise ValueError('query has no {0}'.format(key))
+    return query
+
+
+def answer(data, follower_index, text, text_index=None, cache=None):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index, str,
+        text index, QueryCache) -> bytes
+
+    Return the response to the request text on data.
+
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':['b']},\
+    'b':{'name':'B', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> answer(twv, tf.build_follower_index(twv), 'SEARCH\\na\\nfollowing\\n'\
+    'FILTER\\nPRESENT\\nsort-by username\\nformat short\\n\\n')
+    b"OK 5\\n['b']"
+    >>> answer(twv, None, 'SEARCH\\n')
+    b'ERROR query has no FILTER section\\n'
+    """
+
+    try:
+        query = parse_request(text)
+        body = ''.join(program.iter_query_chunks(data, follower_index,
+                                                 query, text_index, cache))
+    except KeyError as error:
+        return 'ERROR no record for user {0}\n'.format(error).encode()
+    except ValueError as error:
+        return 'ERROR {0}\n'.format(error).encode()
+
+    body = body.encode()
+    return 'OK {0}\n'.format(len(body)).encode() + body
+
+
+async def read_request(reader):
+    """(asyncio.StreamReader) -> str
+
+    Read one request from reader and return it, or return '' if the
+    connection was closed before a whole request arrived.
+    """
+
+    lines = []
+    in_present = False
+
+    while True:
+        line = await reader.readline()
+        if line == b'':
+            return ''
+        line = line.decode(errors='replace')
+        lines.append(line)
+        if line.strip() == 'PRESENT':
+            in_present = True
+        elif in_present and line.strip() == '':
+            return ''.join(lines)
+        # A request that can never reach PRESENT still ends at a blank line
+        # after its search and filter lines, so that it gets an error.
+        elif line.strip() == '' and len(lines) > 2:
+            return ''.join(lines)
+
+
+class QueryServer:
+    """A server answering queries on one loaded twitterverse."""
+
+    def __init__(self, data, follower_index, text_index=None,
+                 max_in_flight=64, workers=4):
+        """(QueryServer, Twitterverse dictionary or TwitterverseGraph,
+            follower index, text index, int, int) -> NoneType
+
+        Initialize a server for queries on data, with at most max_in_flight
+        queries being answered at a time by workers threads.
+        """
+
+        self.data = data
+        self.follower_index = follower_index
+        self.text_index = text_index
+        self.cache = None
+        if not isinstance(data, tg.TwitterverseGraph):
+            self.cache = tc.QueryCache(data, follower_index, text_index)
+        self.max_in_flight = max_in_flight
+        self.in_flight = None
+        self.workers = workers
+        self.executor = None
+
+    async def handle_client(self, reader, writer):
+        """(QueryServer, asyncio.StreamReader, asyncio.StreamWriter)
+            -> NoneType
+
+        Answer each request read from reader on writer, in order, until the
+        client closes the connection.
+        """
+
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                text = await read_request(reader)
+                if text == '':
+                    break
+                async with self.in_flight:
+                    response = await loop.run_in_executor(
+                        self.executor, answer, self.data, self.follower_index,
+                        text, self.text_index, self.cache)
+                    writer.write(response)
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """(QueryServer, str, str, int) -> asyncio.Server
+
+        Start serving on the Unix socket path, or if path is None, on TCP
+        port port of host (any free port if port is 0), and return the
+        asyncio server. Its worker threads run until close is called.
+        """
+
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.executor = ThreadPoolExecutor(self.workers)
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def close(self):
+        """(QueryServer) -> NoneType
+
+        Stop the worker threads once the queries given to them are answered.
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def send_query(client, text):
+    """(socket.socket, str) -> str
+
+    Send the request text on the connected socket client and return the
+    presentation string answering it. Raise ValueError with the server's
+    message if the query failed. Only one request may be sent at a time.
+    """
+
+    client.sendall(text.encode())
+    client_file = client.makefile('rb')
+    try:
+        status, detail = client_file.readline().decode().rstrip(
+            '\n').split(' ', 1)
+        if status == 'ERROR':
+            raise ValueError(detail)
+        return client_file.read(int(detail)).decode()
+    finally:
+        client_file.close()
+
+
+async def serve_forever(data, follower_index, path=None, port=0,
+                        text_index=None, max_in_flight=64, workers=4):
+    """(Twitterverse dictionary or TwitterverseGraph, follower index, str,
+        int, text index, int, int) -> NoneType
+
+    Serve queries on data on the Unix socket path, or on localhost TCP port
+    port if path is None, with workers worker threads, until cancelled.
+    """
+
+    query_server = QueryServer(data, follower_index, text_index,
+                               max_in_flight, workers)
+    server = await query_server.start(path, port=port)
+    for server_socket in server.sockets:
+        if server_socket.family == socket.AF_UNIX:
+            print('Serving on {0}'.format(path), flush=True)
+        else:
+            print('Serving on {0}:{1}'.format(
+                *server_socket.getsockname()[:2]), flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        query_server.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Answer Twitterverse queries on one data file.')
+    parser.add_argument('data_file', help='text data file or snapshot')
+    parser.add_argument('-s', '--socket', help='Unix socket to listen on')
+    parser.add_argument('-p', '--port', type=int, default=0,
+                        help='localhost TCP port to listen on, if no socket '
+                        'is given (default: any free port)')
+    parser.add_argument('-m', '--max-in-flight', type=int, default=64,
+                        help='most queries being answered at a time')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='number of threads answering queries')
+    options = parser.parse_args()
+
+    data, follower_index = program.load_data(options.data_file)
+    text_index = None
+    if not isinstance(data, tg.TwitterverseGraph):
+        text_index = tf.build_text_index(data)
+
+    try:
+        asyncio.run(serve_forever(data, follower_index, options.socket,
+                                  options.port, text_index,
+                                  options.max_in_flight, options.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,198 @@
+"""
+Binary snapshots of a Twitterverse.
+
+A snapshot file holds a TwitterverseGraph (see twitterverse_graph) so that it
+can be loaded without re-parsing the text data file. It is laid out as:
+
+    - a header of HEADER.size bytes, with no padding:
+        - MAGIC, 8 bytes, whose last byte is the format version
+        - BYTE_ORDER_MARK, a native 4-byte unsigned int
+        - a reserved native 4-byte unsigned int, always 0, which keeps the
+          counts after it 8-byte aligned
+        - the number of user IDs n, a native 8-byte unsigned int
+        - the size of the string table in bytes, a native 8-byte unsigned
+          int
+        - the number of following edges, a native 8-byte unsigned int
+        - the number of follower edges, a native 8-byte unsigned int
+    - the string table offsets, 5 * n + 1 native 8-byte ints: the strings of
+      user i are its username, name, location, web and bio, in that order,
+      and string j is bytes offsets[j] to offsets[j + 1] of the string table
+    - following_offsets, following_targets, follower_offsets and
+      follower_sources, as native 4-byte ints
+    - has_record, one byte per user ID
+    - the string table, all strings UTF-8 encoded back to back
+
+load_graph memory-maps the file and uses the arrays in place; only the
+usernames are decoded up front, and other strings are decoded when read.
+It rejects a file with another format version, a reserved field that is
+not 0, or fewer bytes than its header calls for.
+"""
+
+import mmap
+import struct
+from array import array
+
+import twitterverse_graph as tg
+
+MAGIC = b'TWVSNAP1'
+BYTE_ORDER_MARK = 0x01020304
+HEADER = struct.Struct('=8sIIQQQQ')
+
+# The strings stored for each user ID, in snapshot order.
+FIELDS = ['usernames', 'names', 'locations', 'webs', 'bios']
+
+
+class StringColumn:
+    """A read-only sequence of str decoded on access from a snapshot."""
+
+    def __init__(self, table, offsets, field):
+        """(StringColumn, memoryview, memoryview, int) -> NoneType
+
+        Initialize the column of the strings at index field of each user's
+        strings in string table table.
+        """
+
+        self.table = table
+        self.offsets = offsets
+        self.field = field
+
+    def __len__(self):
+        """(StringColumn) -> int
+
+        Return the number of user IDs in this column.
+        """
+
+        return (len(self.offsets) - 1) // len(FIELDS)
+
+    def __getitem__(self, user_id):
+        """(StringColumn, int) -> str
+
+        Return the string of user_id in this column.
+        """
+
+        if user_id < 0 or user_id >= len(self):
+            raise IndexError(user_id)
+        i = user_id * len(FIELDS) + self.field
+        return str(self.table[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+
+def save_graph(graph, snapshot_file):
+    """(TwitterverseGraph, file open for writing in binary mode) -> NoneType
+
+    Write graph to snapshot_file in snapshot format.
+    """
+
+    strings = []
+    offsets = array('q', [0])
+    for user_id in range(len(graph)):
+        for field in FIELDS:
+            encoded = getattr(graph, field)[user_id].encode('utf-8')
+            strings.append(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+
+    snapshot_file.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, 0, len(graph),
+                                    offsets[-1],
+                                    len(graph.following_targets),
+                                    len(graph.follower_sources)))
+    snapshot_file.write(offsets.tobytes())
+    for edges in [graph.following_offsets, graph.following_targets,
+                  graph.follower_offsets, graph.follower_sources]:
+        snapshot_file.write(array('i', edges).tobytes())
+    snapshot_file.write(bytes(graph.has_record))
+    for encoded in strings:
+        snapshot_file.write(encoded)
+
+
+def save_snapshot(twv, snapshot_file):
+    """(Twitterverse dictionary, file open for writing in binary mode)
+        -> NoneType
+
+    Write twitterverse twv, as returned by process_data, to snapshot_file in
+    snapshot format.
+    """
+
+    save_graph(tg.graph_from_twv(twv), snapshot_file)
+
+
+def load_graph(snapshot_file):
+    """(file open for reading in binary mode) -> TwitterverseGraph
+
+    Return the TwitterverseGraph stored in snapshot_file, backed by a
+    read-only memory map of the file. The returned graph stays valid after
+    snapshot_file is closed, but cannot have users added to it.
+    """
+
+    buffer = memoryview(mmap.mmap(snapshot_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ))
+    if len(buffer) < HEADER.size:
+        raise ValueError('not a Twitterverse snapshot')
+    magic, byte_order, reserved, size, table_size, following_count, \
+        follower_count = HEADER.unpack(buffer[0:HEADER.size])
+    if magic[0:-1] != MAGIC[0:-1]:
+        raise ValueError('not a Twitterverse snapshot')
+    if magic != MAGIC:
+        raise ValueError('unsupported snapshot version: {0}'.format(
+            magic[-1:].decode('ascii', 'replace')))
+    if byte_order != BYTE_ORDER_MARK:
+        raise ValueError('snapshot was written with a different byte order')
+    if reserved != 0:
+        raise ValueError('snapshot header has a non-zero reserved field')
+
+    position = HEADER.size
+    sections = []
+    for item_format, count in [('q', len(FIELDS) * size + 1),
+                               ('i', size + 1), ('i', following_count),
+                               ('i', size + 1), ('i', follower_count),
+                               ('B', size), ('B', table_size)]:
+        end = position + struct.calcsize(item_format) * count
+        if end > len(buffer):
+            raise ValueError('snapshot is truncated')
+        sections.append(buffer[position:end].cast(item_format))
+        position = end
+    offsets, following_offsets, following_targets, follower_offsets, \
+        follower_sources, has_record, table = sections
+
+    graph = tg.TwitterverseGraph()
+    for field in range(len(FIELDS)):
+        setattr(graph, FIELDS[field], StringColumn(table, offsets, field))
+    graph.usernames = list(graph.usernames)
+    graph.ids = dict((graph.usernames[user_id], user_id)
+                     for user_id in range(size))
+    graph.has_record = has_record
+    graph.following_offsets = following_offsets
+    graph.following_targets = following_targets
+    graph.follower_offsets = follower_offsets
+    graph.follower_sources = follower_sources
+
+    return graph
+
+
+def load_snapshot(snapshot_file):
+    """(file open for reading in binary mode) -> Twitterverse dictionary
+
+    Return the twitterverse stored in snapshot_file, in the Twitterverse
+    dictionary format returned by process_data.
+    """
+
+    graph = load_graph(snapshot_file)
+    twv = {}
+
+    for user_id in range(len(graph)):
+        if graph.has_record[user_id]:
+            username = graph.usernames[user_id]
+            twv[username] = graph.user_dict(username)
+
+    return twv
+
+
+if __name__ == '__main__':
+
+    data_filename = input('Data file: ')
+    data_file = open(data_filename, 'r')
+    graph = tg.process_graph(data_file)
+    data_file.close()
+
+    snapshot_filename = input('Snapshot file: ')
+    snapshot_file = open(snapshot_filename, 'wb')
+    save_graph(graph, snapshot_file)
+    snapshot_file.close()
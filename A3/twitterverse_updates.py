@@ -0,0 +1,319 @@
+"""
+Incremental updates to a loaded Twitterverse.
+
+Each update keeps a Twitterverse dictionary, and any follower index and text
+index built on it, up to date in place. Follower counts used for sorting by
+popularity are the sizes of the follower index's sets, so they need no
+separate update.
+
+A delta is a list of str, one of:
+
+    - ['add', username]: add a user with an empty profile
+    - ['follow', follower, followed]: follower starts following followed
+    - ['unfollow', follower, followed]: follower stops following followed
+    - ['set', username, field, value]: set field ('name', 'location', 'web'
+      or 'bio') of username's profile to value
+
+A delta log file holds one delta per line, each written as a JSON array, and
+can be replayed on top of a twitterverse loaded from a data file or snapshot.
+
+Functions registered with add_listener are called with the twitterverse
+after each update that changes it.
+"""
+
+import json
+import weakref
+
+import twitterverse_functions as tf
+
+PROFILE_FIELDS = ['name', 'location', 'web', 'bio']
+
+# Weak references to the functions to call after each update.
+_listeners = []
+
+
+def add_listener(listener):
+    """(function) -> NoneType
+
+    Call listener with the twitterverse after each update that changes it.
+    Only a weak reference to listener is kept, so registering does not keep
+    it, or the object of a bound method, alive.
+    """
+
+    if hasattr(listener, '__self__'):
+        _listeners.append(weakref.WeakMethod(listener))
+    else:
+        _listeners.append(weakref.ref(listener))
+
+
+def _notify(twv):
+    """(Twitterverse dictionary) -> NoneType
+
+    Call every live listener with twv, forgetting the ones that were freed.
+    """
+
+    for reference in list(_listeners):
+        listener = reference()
+        if listener is None:
+            _listeners.remove(reference)
+        else:
+            listener(twv)
+
+
+def add_user(twv, username, text_index=None):
+    """(Twitterverse dictionary, str, text index) -> NoneType
+
+    Add username to twitterverse twv with an empty profile, if it is not
+    there already.
+
+    >>> twv = {}
+    >>> add_user(twv, 'a')
+    >>> twv
+    {'a': {'name': '', 'location': '', 'web': '', 'bio': '', 'following': []}}
+    """
+
+    if username in twv:
+        return
+
+    twv[username] = {'name': '', 'location': '', 'web': '', 'bio': '',
+                     'following': []}
+    if text_index is not None:
+        for field in text_index:
+            text_index[field]['lowered'][username] = ''
+    _notify(twv)
+
+
+def follow(twv, follower, followed, follower_index=None, positions=None):
+    """(Twitterverse dictionary, str, str, follower index, following
+        positions) -> NoneType
+
+    Make follower follow followed in twitterverse twv, follower_index and
+    positions (see unfollow), if it does not already. Raise KeyError if
+    follower has no record.
+
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> follower_index = {}
+    >>> follow(twv, 'a', 'b', follower_index)
+    >>> twv['a']['following'], follower_index
+    (['b'], {'b': {'a'}})
+    """
+
+    following = twv[follower]['following']
+
+    # The follower index, or else the positions, answer "already
+    # following?" in O(1) time.
+    if follower_index is not None:
+        if follower in follower_index.get(followed, ()):
+            return
+        if followed not in follower_index:
+            follower_index[followed] = set()
+        follower_index[followed].add(follower)
+    elif positions is not None:
+        if followed in _positions_of(twv, follower, positions):
+            return
+    elif followed in following:
+        return
+
+    if positions is not None:
+        _positions_of(twv, follower, positions)[followed] = [len(following)]
+    following.append(followed)
+    _notify(twv)
+
+
+def unfollow(twv, follower, followed, follower_index=None, positions=None):
+    """(Twitterverse dictionary, str, str, follower index, following
+        positions) -> NoneType
+
+    Make follower stop following followed in twitterverse twv,
+    follower_index and positions. Raise KeyError if follower has no record.
+
+    Each occurrence of followed in follower's following list is replaced
+    by the last user of the list, which is then removed, so the order of
+    the rest can change. positions, if given, is a dict of {str: dict of
+    {str: list of int}} mapping followers to the indexes of each user in
+    their following lists. A follower's entry is built, in time linear in
+    the length of its list, the first time it is needed; from then on each
+    occurrence is found and removed in O(1) time. Without positions, they
+    are found by a scan of the list.
+
+    >>> twv = {\
+    'a':{'name':'A', 'location':'', 'web':'', 'bio':'',\
+    'following':['b', 'c', 'd']}}
+    >>> follower_index = {'b': {'a'}, 'c': {'a'}, 'd': {'a'}}
+    >>> unfollow(twv, 'a', 'b', follower_index, {})
+    >>> twv['a']['following'], sorted(follower_index)
+    (['d', 'c'], ['c', 'd'])
+    """
+
+    following = twv[follower]['following']
+
+    if follower_index is not None:
+        if follower not in follower_index.get(followed, ()):
+            return
+        follower_index[followed].discard(follower)
+        if len(follower_index[followed]) == 0:
+            del follower_index[followed]
+
+    if positions is not None:
+        follower_positions = _positions_of(twv, follower, positions)
+        indexes = follower_positions.pop(followed, [])
+    else:
+        indexes = [index for index in range(len(following))
+                   if following[index] == followed]
+    if len(indexes) == 0:
+        return
+
+    # The highest index goes first, so the last user is never followed.
+    for index in sorted(indexes, reverse=True):
+        last = following.pop()
+        if index < len(following):
+            following[index] = last
+            if positions is not None:
+                moved = follower_positions[last]
+                moved[moved.index(len(following))] = index
+    _notify(twv)
+
+
+def _positions_of(twv, follower, positions):
+    """(Twitterverse dictionary, str, following positions)
+        -> dict of {str: list of int}
+
+    Return the entry of positions (see unfollow) for follower in
+    twitterverse twv, building it if it has none.
+    """
+
+    if follower not in positions:
+        follower_positions = {}
+        following = twv[follower]['following']
+        for index in range(len(following)):
+            if following[index] not in follower_positions:
+                follower_positions[following[index]] = []
+            follower_positions[following[index]].append(index)
+        positions[follower] = follower_positions
+    return positions[follower]
+
+
+def set_profile(twv, username, field, value, text_index=None):
+    """(Twitterverse dictionary, str, str, str, text index) -> NoneType
+
+    Set field of username's profile in twitterverse twv to value, and update
+    text_index to match. Raise KeyError if username has no record, and
+    ValueError if field is not a profile field.
+
+    >>> twv = {\
+    'a':{'name':'Ann', 'location':'', 'web':'', 'bio':'', 'following':[]}}
+    >>> text_index = tf.build_text_index(twv)
+    >>> set_profile(twv, 'a', 'name', 'Bob', text_index)
+    >>> text_index['name']['lowered']['a'], 'ann' in text_index['name']['ngrams']
+    ('bob', False)
+    """
+
+    if field not in PROFILE_FIELDS:
+        raise ValueError('not a profile field: {0}'.format(field))
+
+    old_value = twv[username][field]
+    twv[username][field] = value
+
+    if text_index is not None and field in text_index:
+        field_index = text_index[field]
+        ngrams = field_index['ngrams']
+        for ngram in _ngrams(old_value.lower()):
+            ngrams[ngram].discard(username)
+            if len(ngrams[ngram]) == 0:
+                del ngrams[ngram]
+        for ngram in _ngrams(value.lower()):
+            if ngram not in ngrams:
+                ngrams[ngram] = set()
+            ngrams[ngram].add(username)
+        field_index['lowered'][username] = value.lower()
+
+    _notify(twv)
+
+
+def _ngrams(value):
+    """(str) -> set of str
+
+    Return the set of tf.NGRAM_SIZE-character substrings of value.
+    """
+
+    return set(value[i:i + tf.NGRAM_SIZE]
+               for i in range(len(value) - tf.NGRAM_SIZE + 1))
+
+
+def apply_delta(twv, delta, follower_index=None, text_index=None,
+                positions=None):
+    """(Twitterverse dictionary, list of str, follower index, text index,
+        following positions) -> NoneType
+
+    Apply delta to twitterverse twv and the given indexes and positions
+    (see unfollow). Raise ValueError if delta is not a valid delta.
+
+    >>> twv = {}
+    >>> apply_delta(twv, ['add', 'a'])
+    >>> apply_delta(twv, ['set', 'a', 'bio', 'Hi'])
+    >>> apply_delta(twv, ['follow', 'a', 'b'])
+    >>> twv['a']['bio'], twv['a']['following']
+    ('Hi', ['b'])
+    """
+
+    if len(delta) == 2 and delta[0] == 'add':
+        add_user(twv, delta[1], text_index)
+    elif len(delta) == 3 and delta[0] == 'follow':
+        follow(twv, delta[1], delta[2], follower_index, positions)
+    elif len(delta) == 3 and delta[0] == 'unfollow':
+        unfollow(twv, delta[1], delta[2], follower_index, positions)
+    elif len(delta) == 4 and delta[0] == 'set':
+        set_profile(twv, delta[1], delta[2], delta[3], text_index)
+    else:
+        raise ValueError('not a delta: {0}'.format(delta))
+
+
+def write_delta(delta_file, delta):
+    """(file open for writing, list of str) -> NoneType
+
+    Append delta to the delta log delta_file.
+    """
+
+    delta_file.write(json.dumps(delta) + '\n')
+
+
+def read_deltas(delta_file):
+    """(file open for reading) -> generator of list of str
+
+    Yield each delta in the delta log delta_file, in order. Blank lines are
+    skipped.
+
+    >>> import io
+    >>> list(read_deltas(io.StringIO('["follow", "a", "b"]\\n\\n')))
+    [['follow', 'a', 'b']]
+    """
+
+    for line in delta_file:
+        if line.strip() != '':
+            yield json.loads(line)
+
+
+def replay_deltas(twv, delta_file, follower_index=None, text_index=None):
+    """(Twitterverse dictionary, file open for reading, follower index,
+        text index) -> int
+
+    Apply every delta in the delta log delta_file to twitterverse twv and
+    the given indexes, in order, and return the number of deltas applied.
+    The positions in the following lists (see unfollow) are kept for the
+    whole replay, so each follow and unfollow takes O(1) amortized time.
+    """
+
+    count = 0
+    positions = {}
+
+    for delta in read_deltas(delta_file):
+        apply_delta(twv, delta, follower_index, text_index, positions)
+        count += 1
+
+    return count
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()